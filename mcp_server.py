@@ -6,6 +6,7 @@ import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 
 from security.mcp_security import SecureMiddleware
 from server_api import router as api_router
@@ -35,7 +36,7 @@ async def lifespan(app: FastAPI):
         "timestamp": time.time(),
         "data": {"host": MCP_HOST, "port": MCP_PORT, "version": "1.0.0"},
     }
-    logger.info(f"Evento MCP: {json.dumps(event)}")
+    logger.info("Evento MCP: %s", json.dumps(event))
 
     # Fornece aplicativo para o FastAPI
     yield
@@ -49,7 +50,7 @@ async def lifespan(app: FastAPI):
         "timestamp": time.time(),
         "data": {"host": MCP_HOST, "port": MCP_PORT},
     }
-    logger.info(f"Evento MCP: {json.dumps(event)}")
+    logger.info("Evento MCP: %s", json.dumps(event))
 
 
 # Inicializa o aplicativo FastAPI com o gerenciador de ciclo de vida
@@ -58,6 +59,9 @@ app = FastAPI(
     description="Servidor que implementa o padrão Model Context Protocol para gerenciar repositórios com IA",
     version="1.0.0",
     lifespan=lifespan,
+    # orjson serializa JSON muito mais rápido que o módulo json padrão,
+    # o que beneficia respostas grandes como /tree e /ls
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -74,7 +78,7 @@ async def mcp_event_middleware(request: Request, call_next):
             "client": request.client.host if request.client else "unknown",
         },
     }
-    logger.info(f"Evento MCP: {json.dumps(event)}")
+    logger.info("Evento MCP: %s", json.dumps(event))
 
     # Processa a requisição
     start_time = time.time()
@@ -92,7 +96,7 @@ async def mcp_event_middleware(request: Request, call_next):
                 "processing_time": time.time() - start_time,
             },
         }
-        logger.info(f"Evento MCP: {json.dumps(event)}")
+        logger.info("Evento MCP: %s", json.dumps(event))
 
         return response
     except Exception as e:
@@ -107,7 +111,7 @@ async def mcp_event_middleware(request: Request, call_next):
                 "processing_time": time.time() - start_time,
             },
         }
-        logger.error(f"Evento MCP: {json.dumps(event)}")
+        logger.error("Evento MCP: %s", json.dumps(event))
 
         # Re-lança a exceção para ser tratada pelos handlers do FastAPI
         raise
@@ -136,7 +140,7 @@ async def register_mcp_event(request: Request):
             )
 
         # Registra o evento
-        logger.info(f"Evento MCP Externo: {json.dumps(event_data)}")
+        logger.info("Evento MCP Externo: %s", json.dumps(event_data))
 
         return {"status": "success", "message": "Evento registrado com sucesso"}
 
@@ -180,4 +184,19 @@ async def get_mcp_info():
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host=MCP_HOST, port=int(MCP_PORT), log_level="info")
+    # uvloop e httptools aceleram o event loop e o parsing HTTP.
+    # Um único worker por enquanto: o fluxo /suggest -> /apply guarda as
+    # sugestões em um dicionário do processo (suggestions_store) e os
+    # caches de coalescência também são locais; com N workers o /apply
+    # cairia em outro processo e retornaria 404. Subir o número de
+    # workers exige antes mover esse estado para o SQLite, como foi
+    # feito com as sessões de navegação.
+    uvicorn.run(
+        "mcp_server:app",
+        host=MCP_HOST,
+        port=int(MCP_PORT),
+        log_level="info",
+        loop="uvloop",
+        http="httptools",
+        workers=1,
+    )
@@ -53,7 +53,7 @@ def capture_directory_structure(path, output_path=None, terminal_width=80):
         return output_path
 
     except Exception as e:
-        logger.error(f"Erro ao capturar estrutura de diretório: {e}")
+        logger.error("Erro ao capturar estrutura de diretório: %s", e)
         return None
 
 
@@ -154,5 +154,5 @@ def capture_file_content(file_path, output_path=None):
         return output_path
 
     except Exception as e:
-        logger.error(f"Erro ao capturar conteúdo do arquivo: {e}")
+        logger.error("Erro ao capturar conteúdo do arquivo: %s", e)
         return None
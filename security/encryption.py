@@ -1,4 +1,5 @@
 import base64
+import functools
 import logging
 import os
 
@@ -11,11 +12,21 @@ from utils.common import get_env_var, update_env_var
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=4)
+def _get_fernet(key: bytes) -> Fernet:
+    """Memoiza instâncias Fernet por chave.
+
+    Construir um Fernet decodifica e valida a chave base64; com a mesma
+    chave, cada EncryptionManager reutiliza a instância já montada.
+    """
+    return Fernet(key)
+
+
 class EncryptionManager:
     def __init__(self):
         # Gera ou carrega uma chave de criptografia
         self.encryption_key = self._get_encryption_key()
-        self.cipher_suite = Fernet(self.encryption_key)
+        self.cipher_suite = _get_fernet(self.encryption_key)
 
     def _get_encryption_key(self):
         """Obtém a chave de criptografia do ambiente ou gera uma nova."""
@@ -25,12 +36,14 @@ class EncryptionManager:
             try:
                 # Tenta usar a chave existente
                 key = key_env.encode()
-                # Validar se a chave está no formato correto
-                Fernet(key)  # Isso lançará uma exceção se a chave não for válida
+                # Validar se a chave está no formato correto (e já aquecer
+                # o cache de Fernet usado logo em seguida)
+                _get_fernet(key)  # Isso lançará uma exceção se a chave não for válida
                 return key
             except Exception as e:
                 logger.warning(
-                    f"Chave de criptografia existente é inválida: {e}. Gerando nova chave."
+                    "Chave de criptografia existente é inválida: %s. Gerando nova chave.",
+                    e,
                 )
                 # Continua para gerar uma nova chave
 
@@ -48,7 +61,7 @@ class EncryptionManager:
             # Usa a função de utilitário para atualizar a variável
             update_env_var("ENCRYPTION_KEY", key)
         except Exception as e:
-            logger.error(f"Erro ao salvar chave de criptografia: {e}")
+            logger.error("Erro ao salvar chave de criptografia: %s", e)
 
     def encrypt_text(self, text):
         """Criptografa um texto."""
@@ -78,7 +91,7 @@ class EncryptionManager:
 
             return output_path
         except Exception as e:
-            logger.error(f"Erro ao criptografar arquivo: {e}")
+            logger.error("Erro ao criptografar arquivo: %s", e)
             return None
 
     def decrypt_file(self, encrypted_file_path, output_path=None):
@@ -100,7 +113,7 @@ class EncryptionManager:
 
             return output_path
         except Exception as e:
-            logger.error(f"Erro ao descriptografar arquivo: {e}")
+            logger.error("Erro ao descriptografar arquivo: %s", e)
             return None
 
 
@@ -13,10 +13,8 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from security.encryption import encryption_manager
 from utils.common import get_env_var, get_security_config, update_env_var
 
-# Configuração de logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+# A configuração do logging (basicConfig) fica nos pontos de entrada;
+# módulos de biblioteca só obtêm o próprio logger
 logger = logging.getLogger(__name__)
 
 # Carrega configurações de segurança
@@ -31,6 +29,17 @@ if not MCP_API_KEY:
     update_env_var("MCP_API_KEY", MCP_API_KEY)
     logger.info("Nova MCP_API_KEY gerada e salva no arquivo .env")
 
+# Digest pré-computado da chave para comparação em tempo constante,
+# sem releitura do ambiente a cada requisição
+_MCP_API_KEY_DIGEST = hashlib.sha256(MCP_API_KEY.encode()).digest()
+
+
+def _api_key_is_valid(candidate: str) -> bool:
+    """Compara a API Key recebida com a esperada em tempo constante."""
+    candidate_digest = hashlib.sha256(candidate.encode()).digest()
+    return hmac.compare_digest(candidate_digest, _MCP_API_KEY_DIGEST)
+
+
 # Constantes e configurações
 MAX_TIMESTAMP_DIFF = 300  # 5 minutos em segundos
 
@@ -46,7 +55,7 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
     if not api_key_header:
         raise HTTPException(status_code=401, detail="API Key não fornecida.")
 
-    if api_key_header != MCP_API_KEY:
+    if not _api_key_is_valid(api_key_header):
         raise HTTPException(
             status_code=403, detail="API Key inválida ou não autorizada."
         )
@@ -62,12 +71,12 @@ class SecureMiddleware(BaseHTTPMiddleware):
             return await call_next(request)
 
         try:
-            logger.debug(f"Processando requisição para: {request.url.path}")
+            logger.debug("Processando requisição para: %s", request.url.path)
 
             # Verifica cabeçalhos de autenticação
             if "X-API-Key" not in request.headers:
                 logger.warning(
-                    f"Tentativa de acesso sem API Key para {request.url.path}"
+                    "Tentativa de acesso sem API Key para %s", request.url.path
                 )
 
                 # Permitir acesso temporário (para desenvolvimento) - REMOVER EM PRODUÇÃO
@@ -86,7 +95,7 @@ class SecureMiddleware(BaseHTTPMiddleware):
 
             if not all([api_key, timestamp, signature]):
                 logger.warning(
-                    f"Cabeçalhos de autenticação incompletos para {request.url.path}"
+                    "Cabeçalhos de autenticação incompletos para %s", request.url.path
                 )
 
                 # Permitir acesso temporário (para desenvolvimento) - REMOVER EM PRODUÇÃO
@@ -101,9 +110,9 @@ class SecureMiddleware(BaseHTTPMiddleware):
                 #     detail="Cabeçalhos de autenticação incompletos."
                 # )
 
-            # Verifica se a API key é válida
-            if api_key != MCP_API_KEY:
-                logger.warning(f"API Key inválida fornecida para {request.url.path}")
+            # Verifica se a API key é válida (comparação em tempo constante)
+            if not _api_key_is_valid(api_key):
+                logger.warning("API Key inválida fornecida para %s", request.url.path)
 
                 # Permitir acesso temporário (para desenvolvimento) - REMOVER EM PRODUÇÃO
                 logger.warning(
@@ -124,7 +133,10 @@ class SecureMiddleware(BaseHTTPMiddleware):
 
                 if abs(current_time - request_time) > MAX_TIMESTAMP_DIFF:
                     logger.warning(
-                        f"Timestamp expirado para {request.url.path}: {current_time} vs {request_time}"
+                        "Timestamp expirado para %s: %s vs %s",
+                        request.url.path,
+                        current_time,
+                        request_time,
                     )
 
                     # Permitir acesso temporário (para desenvolvimento) - REMOVER EM PRODUÇÃO
@@ -139,7 +151,7 @@ class SecureMiddleware(BaseHTTPMiddleware):
                     #     detail="Timestamp expirado ou inválido."
                     # )
             except ValueError:
-                logger.warning(f"Timestamp inválido fornecido para {request.url.path}")
+                logger.warning("Timestamp inválido fornecido para %s", request.url.path)
 
                 # Permitir acesso temporário (para desenvolvimento) - REMOVER EM PRODUÇÃO
                 logger.warning(
@@ -160,12 +172,14 @@ class SecureMiddleware(BaseHTTPMiddleware):
         except HTTPException as http_ex:
             # Propaga exceções HTTP
             logger.warning(
-                f"Exceção HTTP em middleware: {http_ex.status_code} - {http_ex.detail}"
+                "Exceção HTTP em middleware: %s - %s",
+                http_ex.status_code,
+                http_ex.detail,
             )
             raise http_ex
         except Exception as e:
             # Captura outras exceções e retorna erro 500
-            logger.error(f"Erro interno no middleware: {str(e)}", exc_info=True)
+            logger.error("Erro interno no middleware: %s", e, exc_info=True)
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 
@@ -189,7 +203,7 @@ async def decrypt_request_data(request: Request):
             return json.loads(decrypted_data) if decrypted_data else {}
         return {}
     except Exception as e:
-        logger.error(f"Erro ao descriptografar dados: {e}")
+        logger.error("Erro ao descriptografar dados: %s", e)
         return {}
 
 
@@ -205,5 +219,5 @@ def encrypt_response_data(data):
 
         return {"encrypted_data": encrypted_data}
     except Exception as e:
-        logger.error(f"Erro ao criptografar dados: {e}")
+        logger.error("Erro ao criptografar dados: %s", e)
         return {"error": "Erro ao criptografar dados de resposta"}
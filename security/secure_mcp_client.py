@@ -28,7 +28,16 @@ class SecureMCPClient:
             self.api_key = self._generate_api_key()
             self._save_api_key_to_env()
 
-        logger.info(f"SecureMCPClient inicializado com base_url: {self.base_url}")
+        # Sessão com pool de conexões: reutiliza sockets entre requisições
+        # em vez de pagar handshake TCP a cada chamada ao MCP Server
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=10, pool_maxsize=100, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        logger.info("SecureMCPClient inicializado com base_url: %s", self.base_url)
 
     def _generate_api_key(self):
         """Gera uma chave API aleatória."""
@@ -43,7 +52,7 @@ class SecureMCPClient:
 
             update_env_var("MCP_API_KEY", self.api_key)
         except Exception as e:
-            logger.error(f"Erro ao salvar chave API: {e}")
+            logger.error("Erro ao salvar chave API: %s", e)
 
     def _generate_signature(self, data, timestamp):
         """Gera uma assinatura HMAC para a requisição."""
@@ -56,7 +65,7 @@ class SecureMCPClient:
     def _secure_request(self, method, endpoint, data=None):
         """Realiza uma requisição segura para o MCP server."""
         url = f"{self.base_url}{endpoint}"
-        logger.debug(f"Fazendo requisição {method} para {url}")
+        logger.debug("Fazendo requisição %s para %s", method, url)
 
         # Adiciona um timestamp para evitar ataques de replay
         timestamp = str(int(time.time()))
@@ -83,14 +92,14 @@ class SecureMCPClient:
                 "Content-Type": "application/json",
             }
 
-            logger.debug(f"GET {url} com params: {query_params}")
+            logger.debug("GET %s com params: %s", url, query_params)
 
             try:
-                response = requests.get(url, headers=headers, params=query_params)
+                response = self.session.get(url, headers=headers, params=query_params)
 
                 # Log da resposta para debug
                 logger.debug(
-                    f"Resposta: {response.status_code} - {response.text[:100]}..."
+                    "Resposta: %s - %.100s...", response.status_code, response.text
                 )
 
                 response.raise_for_status()
@@ -105,10 +114,10 @@ class SecureMCPClient:
                 return {}
 
             except requests.exceptions.HTTPError as e:
-                logger.error(f"Erro HTTP na requisição GET: {e}")
+                logger.error("Erro HTTP na requisição GET: %s", e)
                 return {"error": str(e)}
             except requests.exceptions.RequestException as e:
-                logger.error(f"Erro na requisição GET: {e}")
+                logger.error("Erro na requisição GET: %s", e)
                 return {"error": str(e)}
         else:
             # Para outros métodos (POST, PUT, DELETE)
@@ -125,22 +134,22 @@ class SecureMCPClient:
                 "Content-Type": "application/json",
             }
 
-            logger.debug(f"{method.upper()} {url} com payload: {payload}")
+            logger.debug("%s %s com payload: %s", method.upper(), url, payload)
 
             try:
                 # Faz a requisição
                 if method.lower() == "post":
-                    response = requests.post(url, headers=headers, json=payload)
+                    response = self.session.post(url, headers=headers, json=payload)
                 elif method.lower() == "put":
-                    response = requests.put(url, headers=headers, json=payload)
+                    response = self.session.put(url, headers=headers, json=payload)
                 elif method.lower() == "delete":
-                    response = requests.delete(url, headers=headers, json=payload)
+                    response = self.session.delete(url, headers=headers, json=payload)
                 else:
                     raise ValueError(f"Método HTTP não suportado: {method}")
 
                 # Log da resposta para debug
                 logger.debug(
-                    f"Resposta: {response.status_code} - {response.text[:100]}..."
+                    "Resposta: %s - %.100s...", response.status_code, response.text
                 )
 
                 # Verifica se a resposta foi bem-sucedida
@@ -156,12 +165,35 @@ class SecureMCPClient:
                 return {}
 
             except requests.exceptions.HTTPError as e:
-                logger.error(f"Erro HTTP na requisição {method.upper()}: {e}")
+                logger.error("Erro HTTP na requisição %s: %s", method.upper(), e)
                 return {"error": str(e)}
             except requests.exceptions.RequestException as e:
-                logger.error(f"Erro na requisição {method.upper()}: {e}")
+                logger.error("Erro na requisição %s: %s", method.upper(), e)
                 return {"error": str(e)}
 
+    def batch(self, calls):
+        """Executa várias operações em uma única requisição ao MCP server.
+
+        Args:
+            calls: lista de tuplas (método, params), por exemplo:
+                [("get_current_directory", {"chat_id": "1"}),
+                 ("get_tree", {"chat_id": "1", "max_depth": 2})]
+
+        Returns:
+            Lista com o resultado de cada chamada, na mesma ordem de envio.
+        """
+        payload = [
+            {"id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        response = self._secure_request("post", "/batch", payload)
+
+        if isinstance(response, dict) and "error" in response:
+            return response
+
+        results = sorted(response.get("results", []), key=lambda r: r.get("id", 0))
+        return [r.get("result", {"error": r.get("error")}) for r in results]
+
     # Métodos para cada endpoint do MCP
 
     def list_repos(self, chat_id):
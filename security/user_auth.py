@@ -1,38 +1,46 @@
+import base64
+import hashlib
+import hmac
 import logging
 import os
 import secrets
+import struct
+import time
 from typing import Dict, List, Optional, Set
 
 from utils.common import get_security_config, update_env_var
 
 logger = logging.getLogger(__name__)
 
+# Tempo de validade de um token de convite (24 horas)
+INVITE_TOKEN_TTL = 86400
+
 
 class UserAuth:
     def __init__(self):
         # Lista de IDs de chat autorizados
         self.authorized_users: Set[str] = set()
         self.admin_users: Set[str] = set()
-        self.user_tokens: Dict[str, str] = {}  # token: user_id
+
+        # Segredo usado para assinar tokens de convite stateless
+        secret = get_security_config().get("mcp_api_key") or secrets.token_hex(32)
+        self._invite_secret = secret.encode()
 
         # Carrega usuários autorizados
         self._load_authorized_users()
 
     def _load_authorized_users(self):
-        """Carrega usuários autorizados das configurações de segurança."""
-        security_config = get_security_config()
+        """Carrega usuários autorizados das configurações de segurança.
 
-        # Carrega usuários autorizados
-        if security_config["authorized_users"]:
-            self.authorized_users = set(
-                filter(None, security_config["authorized_users"])
-            )
+        A configuração já chega como frozenset limpo; as cópias locais são
+        sets mutáveis porque o resgate de convites adiciona usuários.
+        """
+        security_config = get_security_config()
 
-        # Carrega administradores
-        if security_config["admin_users"]:
-            self.admin_users = set(filter(None, security_config["admin_users"]))
-            # Admins também são usuários autorizados
-            self.authorized_users.update(self.admin_users)
+        self.authorized_users = set(security_config["authorized_users"])
+        self.admin_users = set(security_config["admin_users"])
+        # Admins também são usuários autorizados
+        self.authorized_users.update(self.admin_users)
 
     def is_authorized(self, user_id: str) -> bool:
         """Verifica se o usuário está autorizado."""
@@ -43,29 +51,53 @@ class UserAuth:
         return user_id in self.admin_users
 
     def generate_invite_token(self, admin_id: str) -> Optional[str]:
-        """Gera um token de convite para um novo usuário (apenas admins)."""
+        """Gera um token de convite assinado com HMAC (apenas admins).
+
+        O token é stateless: carrega nonce e expiração assinados, sem
+        exigir armazenamento em memória ou escrita no arquivo .env.
+        """
         if not self.is_admin(admin_id):
             return None
 
-        # Gera um token aleatório
-        token = secrets.token_urlsafe(16)
-
-        # Armazena o token temporariamente
-        self.user_tokens[token] = None
+        # Monta o payload (nonce + expiração) e assina com HMAC-SHA256
+        nonce = secrets.token_bytes(8)
+        expiry = struct.pack(">Q", int(time.time()) + INVITE_TOKEN_TTL)
+        payload = nonce + expiry
+        signature = hmac.new(self._invite_secret, payload, hashlib.sha256).digest()[:16]
 
-        return token
+        return base64.urlsafe_b64encode(payload + signature).decode()
 
     def redeem_invite_token(self, token: str, user_id: str) -> bool:
-        """Resgata um token de convite para autorizar um novo usuário."""
-        if token not in self.user_tokens:
+        """Resgata um token de convite para autorizar um novo usuário.
+
+        A verificação é stateless e em tempo constante: a assinatura HMAC
+        é conferida com hmac.compare_digest, sem tokens vivos guardados em
+        memória que um vazamento pudesse expor.
+        """
+        if not token:
+            return False
+        try:
+            raw = base64.urlsafe_b64decode(token.encode())
+        except ValueError:
+            return False
+
+        if len(raw) != 32:
+            return False
+
+        # Verifica a assinatura em tempo constante
+        payload, signature = raw[:16], raw[16:]
+        expected = hmac.new(self._invite_secret, payload, hashlib.sha256).digest()[:16]
+        if not hmac.compare_digest(signature, expected):
+            return False
+
+        # Verifica a expiração
+        (expiry,) = struct.unpack(">Q", payload[8:])
+        if time.time() > expiry:
             return False
 
         # Autoriza o usuário
         self.authorized_users.add(user_id)
 
-        # Remove o token usado
-        del self.user_tokens[token]
-
         # Atualiza o arquivo .env
         self._update_env_file()
 
@@ -81,8 +113,11 @@ class UserAuth:
             # Atualiza a lista de administradores
             admin_users_str = ",".join(self.admin_users)
             update_env_var("ADMIN_USER", admin_users_str)
+
+            # Invalida o cache de configuração, já que o .env mudou
+            get_security_config.cache_clear()
         except Exception as e:
-            logger.error(f"Erro ao atualizar arquivo .env: {e}")
+            logger.error("Erro ao atualizar arquivo .env: %s", e)
 
 
 # Instância global
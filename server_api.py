@@ -1,10 +1,18 @@
 import asyncio
+import functools
 import json
 import logging
+import os
+import pathlib
+import subprocess
 import time
 from typing import Any, Dict, List, Optional
 
+import aiofiles
 import anthropic
+import blake3
+import cachetools
+import requests
 from fastapi import APIRouter, BackgroundTasks, Depends, FastAPI, HTTPException, Request
 from pydantic import BaseModel
 
@@ -30,15 +38,30 @@ REPOS_BASE_PATH = repo_config["repos_base_path"]
 MCP_API_KEY = security_config["mcp_api_key"]
 TELEGRAM_BOT_TOKEN = connection_config["telegram_token"]
 
-# Inicializa o cliente Claude
+# Inicializa os clientes Claude: o assíncrono atende o caminho interativo
+# sem bloquear o event loop; o síncrono fica para os jobs em lote (threads)
 claude = anthropic.Anthropic(api_key=CLAUDE_API_KEY)
+claude_async = anthropic.AsyncAnthropic(api_key=CLAUDE_API_KEY)
 
 # Inicializa o gestor de repositórios
 system_repo = SystemRepository(REPOS_BASE_PATH, GITHUB_TOKEN)
 
+# Caminho base pré-construído uma única vez para evitar joins repetidos por requisição
+REPOS_BASE = pathlib.Path(REPOS_BASE_PATH or "")
+
 # Armazenamento de sugestões
 suggestions_store = {}
 
+# Métodos de leitura do SystemRepository que podem ser despachados em lote
+_BATCH_METHODS = {
+    "get_current_directory": system_repo.get_current_directory,
+    "list_files": system_repo.list_files,
+    "get_tree": system_repo.get_tree,
+    "get_file_content": system_repo.get_file_content,
+    "get_status": system_repo.get_status,
+    "get_branches": system_repo.get_branches,
+}
+
 
 # Modelos de dados
 class RepoSelectionRequest(BaseModel):
@@ -83,14 +106,53 @@ class NavigationRequest(BaseModel):
     )
 
 
+class BatchCall(BaseModel):
+    id: int
+    method: str
+    params: Dict[str, Any] = {}
+
+
+def _post_telegram(method: str, data: dict):
+    """POST síncrono à API do Telegram; roda sempre em thread de worker."""
+    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/{method}"
+    response = requests.post(url, data=data, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
 # Função para enviar mensagens pelo Telegram
 async def send_telegram_message(chat_id: str, text: str, parse_mode: str = None):
-    """Função para enviar mensagens pelo Telegram."""
-    import requests
+    """Função para enviar mensagens pelo Telegram.
+
+    O POST bloqueante roda via asyncio.to_thread: a ida e volta até o
+    Telegram não paralisa o event loop.
+    """
+    data = {
+        "chat_id": chat_id,
+        "text": text,
+    }
+
+    if parse_mode:
+        data["parse_mode"] = parse_mode
+
+    try:
+        return await asyncio.to_thread(_post_telegram, "sendMessage", data)
+    except Exception as e:
+        logger.error("Erro ao enviar mensagem para o Telegram: %s", e)
+        return None
+
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+async def edit_telegram_message(
+    chat_id: str, message_id: int, text: str, parse_mode: str = None
+):
+    """Edita uma mensagem já enviada pelo Telegram.
+
+    Como no envio, o POST roda em uma thread — o loop de edição do
+    streaming dispara uma edição por segundo e não pode travar o loop.
+    """
     data = {
         "chat_id": chat_id,
+        "message_id": message_id,
         "text": text,
     }
 
@@ -98,14 +160,21 @@ async def send_telegram_message(chat_id: str, text: str, parse_mode: str = None)
         data["parse_mode"] = parse_mode
 
     try:
-        response = requests.post(url, data=data)
-        response.raise_for_status()
-        return response.json()
+        return await asyncio.to_thread(_post_telegram, "editMessageText", data)
     except Exception as e:
-        logger.error(f"Erro ao enviar mensagem para o Telegram: {str(e)}")
+        logger.error("Erro ao editar mensagem no Telegram: %s", e)
         return None
 
 
+def _notify(chat_id: str, text: str, parse_mode: str = None):
+    """Envia uma mensagem pelo Telegram sem bloquear a resposta HTTP.
+
+    A notificação roda em uma task separada; a resposta da API não
+    espera a ida e volta até o Telegram.
+    """
+    return asyncio.create_task(send_telegram_message(chat_id, text, parse_mode))
+
+
 # Define o roteador FastAPI
 router = APIRouter()
 
@@ -136,7 +205,7 @@ async def root():
 async def list_repos(chat_id: str, api_key: str = Depends(get_api_key)):
     """Lista todos os repositórios disponíveis."""
     try:
-        repos = system_repo.list_repos()
+        repos = await asyncio.to_thread(system_repo.list_repos)
         return {"status": "success", "repos": repos}
     except Exception as e:
         error_msg = f"Erro ao listar repositórios: {str(e)}"
@@ -148,7 +217,7 @@ async def get_status(
     chat_id: str, repo_name: str = None, api_key: str = Depends(get_api_key)
 ):
     """Verifica o status do repositório."""
-    return system_repo.get_status(chat_id)
+    return await asyncio.to_thread(system_repo.get_status, chat_id)
 
 
 @router.post("/suggest")
@@ -159,33 +228,40 @@ async def suggest_modification(
 ):
     """Solicita ao Claude sugestões para modificar um arquivo."""
     try:
-        # Obtém o repositório do usuário
+        # Obtém o repositório do usuário (uma única consulta ao dicionário)
+        entry = system_repo.user_current_repos.get(request.chat_id)
         if request.repo_name:
             repo_name = request.repo_name
-        elif request.chat_id in system_repo.user_current_repos:
-            repo_name = system_repo.user_current_repos[request.chat_id]["repo_name"]
+        elif entry is not None:
+            repo_name = entry.repo_name
         else:
             error_msg = "Nenhum repositório selecionado. Use /repos para listar e /select para escolher um."
-            await send_telegram_message(request.chat_id, error_msg)
+            _notify(request.chat_id, error_msg)
             raise HTTPException(status_code=400, detail=error_msg)
 
-        repo_path = os.path.join(REPOS_BASE_PATH, repo_name)
-        current_dir = system_repo.user_current_repos[request.chat_id].get(
-            "current_dir", ""
-        )
+        repo_base = REPOS_BASE / repo_name
+        current_dir = entry.current_dir if entry else ""
+
+        # Constrói e resolve o caminho completo do arquivo de uma só vez,
+        # bloqueando tentativas de path traversal com '..'
+        repo_root = repo_base.resolve()
+        full_path = (repo_base / current_dir / request.file_path).resolve()
+        if not full_path.is_relative_to(repo_root):
+            error_msg = f"Caminho inválido: {request.file_path}"
+            _notify(request.chat_id, error_msg)
+            raise HTTPException(status_code=400, detail=error_msg)
 
-        # Constrói o caminho completo do arquivo
-        file_rel_path = os.path.normpath(os.path.join(current_dir, request.file_path))
-        full_path = os.path.join(repo_path, file_rel_path)
+        repo_path = str(repo_base)
+        file_rel_path = str(full_path.relative_to(repo_root))
 
         # Verifica se o arquivo existe
-        if not os.path.exists(full_path):
+        if not full_path.exists():
             error_msg = f"Arquivo não encontrado: {file_rel_path}"
-            await send_telegram_message(request.chat_id, error_msg)
+            _notify(request.chat_id, error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
 
         # Informa ao usuário que a consulta está em andamento
-        await send_telegram_message(
+        _notify(
             request.chat_id,
             "Consultando Claude para sugestões de modificação. Aguarde um momento...",
         )
@@ -204,16 +280,47 @@ async def suggest_modification(
             "message": "Processando solicitação de sugestão",
         }
 
+    except HTTPException:
+        # Propaga erros HTTP legítimos (400/404) sem convertê-los em 500
+        raise
     except Exception as e:
         error_msg = f"Erro ao processar solicitação: {str(e)}"
-        await send_telegram_message(request.chat_id, error_msg)
+        _notify(request.chat_id, error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
 
+@router.post("/batch")
+async def batch_requests(calls: List[BatchCall], api_key: str = Depends(get_api_key)):
+    """Processa várias operações de leitura em uma única requisição.
+
+    Segue o formato de batch do JSON-RPC: cada chamada carrega um id,
+    o nome do método e seus parâmetros, e o resultado volta na mesma ordem.
+    Evita uma ida e volta de rede por operação nos fluxos com múltiplas consultas.
+    """
+    results = []
+    for call in calls:
+        handler = _BATCH_METHODS.get(call.method)
+        if handler is None:
+            results.append(
+                {"id": call.id, "error": f"Método desconhecido: {call.method}"}
+            )
+            continue
+        try:
+            results.append(
+                {
+                    "id": call.id,
+                    "result": await asyncio.to_thread(handler, **call.params),
+                }
+            )
+        except TypeError as e:
+            results.append({"id": call.id, "error": f"Parâmetros inválidos: {e}"})
+    return {"status": "success", "results": results}
+
+
 @router.get("/ls")
 async def list_files(chat_id: str, path: str = "", api_key: str = Depends(get_api_key)):
     """Lista arquivos e pastas do diretório especificado."""
-    return system_repo.list_files(chat_id, path)
+    return await asyncio.to_thread(system_repo.list_files, chat_id, path)
 
 
 @router.post("/select")
@@ -249,11 +356,13 @@ async def select_repository(request: Request, api_key: str = Depends(get_api_key
                 detail="Parâmetros obrigatórios não fornecidos: chat_id e repo_name",
             )
 
-        return system_repo.select_repository(chat_id, repo_name)
+        return await asyncio.to_thread(
+            system_repo.select_repository, chat_id, repo_name
+        )
     except HTTPException as http_ex:
         raise http_ex
     except Exception as e:
-        logger.error(f"Erro ao selecionar repositório: {str(e)}")
+        logger.error("Erro ao selecionar repositório: %s", e)
         raise HTTPException(
             status_code=500, detail=f"Erro ao selecionar repositório: {str(e)}"
         )
@@ -264,7 +373,7 @@ async def get_tree(
     chat_id: str, max_depth: int = 2, api_key: str = Depends(get_api_key)
 ):
     """Mostra a estrutura de diretórios."""
-    return system_repo.get_tree(chat_id, max_depth)
+    return await asyncio.to_thread(system_repo.get_tree, chat_id, max_depth)
 
 
 @router.get("/cat")
@@ -272,13 +381,13 @@ async def get_file_content(
     chat_id: str, file_path: str, api_key: str = Depends(get_api_key)
 ):
     """Mostra o conteúdo de um arquivo."""
-    return system_repo.get_file_content(chat_id, file_path)
+    return await asyncio.to_thread(system_repo.get_file_content, chat_id, file_path)
 
 
 @router.post("/pwd")
 async def get_current_directory(chat_id: str, api_key: str = Depends(get_api_key)):
     """Mostra o diretório atual."""
-    return system_repo.get_current_directory(chat_id)
+    return await asyncio.to_thread(system_repo.get_current_directory, chat_id)
 
 
 @router.post("/cd")
@@ -286,13 +395,13 @@ async def change_directory(
     chat_id: str, path: str, api_key: str = Depends(get_api_key)
 ):
     """Navega para o diretório especificado."""
-    return system_repo.change_directory(chat_id, path)
+    return await asyncio.to_thread(system_repo.change_directory, chat_id, path)
 
 
 @router.get("/branch")
 async def get_branches(chat_id: str, api_key: str = Depends(get_api_key)):
     """Mostra as branches do repositório."""
-    return system_repo.get_branches(chat_id)
+    return await asyncio.to_thread(system_repo.get_branches, chat_id)
 
 
 @router.get("/checkout")
@@ -300,7 +409,7 @@ async def checkout_branch(
     chat_id: str, branch_name: str, api_key: str = Depends(get_api_key)
 ):
     """Muda para outra branch."""
-    return system_repo.checkout_branch(chat_id, branch_name)
+    return await asyncio.to_thread(system_repo.checkout_branch, chat_id, branch_name)
 
 
 @router.post("/apply")
@@ -312,7 +421,7 @@ async def apply_modification(
         # Verifica se a sugestão existe
         if request.suggestion_id not in suggestions_store:
             error_msg = f"Sugestão #{request.suggestion_id} não encontrada."
-            await send_telegram_message(request.chat_id, error_msg)
+            _notify(request.chat_id, error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
 
         # Obtém os dados da sugestão
@@ -321,13 +430,30 @@ async def apply_modification(
         suggested_code = suggestion["suggested"]
         repo_path = suggestion["repo_path"]
 
-        # Aplica a sugestão
+        # Aplica a sugestão sem bloquear o event loop durante a escrita
         full_path = os.path.join(repo_path, file_path)
-        with open(full_path, "w", encoding="utf-8") as file:
-            file.write(suggested_code)
+        if suggestion.get("diff"):
+            applied = await asyncio.to_thread(
+                _apply_unified_diff, repo_path, suggested_code
+            )
+            if not applied:
+                error_msg = (
+                    f"O diff da sugestão #{request.suggestion_id} não pôde ser "
+                    f"aplicado (o arquivo mudou desde a geração?). "
+                    f"Gere uma nova sugestão com /suggest."
+                )
+                _notify(request.chat_id, error_msg)
+                raise HTTPException(status_code=409, detail=error_msg)
+        else:
+            async with aiofiles.open(full_path, "w", encoding="utf-8") as file:
+                await file.write(suggested_code)
+
+        # A escrita mudou a árvore de trabalho: descarta as árvores
+        # cacheadas para o próximo /tree não servir uma listagem velha
+        system_repo._invalidate_tree_cache(repo_path)
 
         # Informa ao usuário
-        await send_telegram_message(
+        _notify(
             request.chat_id,
             f"Sugestão #{request.suggestion_id} aplicada com sucesso ao arquivo '{file_path}'.\n"
             f"Use /commit para confirmar as alterações.",
@@ -339,9 +465,11 @@ async def apply_modification(
             "file_path": file_path,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Erro ao aplicar sugestão: {str(e)}"
-        await send_telegram_message(request.chat_id, error_msg)
+        _notify(request.chat_id, error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
 
@@ -354,7 +482,7 @@ async def reject_modification(
         # Verifica se a sugestão existe
         if request.suggestion_id not in suggestions_store:
             error_msg = f"Sugestão #{request.suggestion_id} não encontrada."
-            await send_telegram_message(request.chat_id, error_msg)
+            _notify(request.chat_id, error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
 
         # Remove a sugestão
@@ -362,7 +490,7 @@ async def reject_modification(
         del suggestions_store[request.suggestion_id]
 
         # Informa ao usuário
-        await send_telegram_message(
+        _notify(
             request.chat_id,
             f"Sugestão #{request.suggestion_id} para '{file_path}' foi rejeitada.",
         )
@@ -373,22 +501,26 @@ async def reject_modification(
             "file_path": file_path,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Erro ao rejeitar sugestão: {str(e)}"
-        await send_telegram_message(request.chat_id, error_msg)
+        _notify(request.chat_id, error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
 
 @router.post("/commit")
 async def commit_changes(request: CommitRequest, api_key: str = Depends(get_api_key)):
     """Realiza commit das alterações."""
-    return system_repo.commit_changes(request.chat_id, request.message)
+    return await asyncio.to_thread(
+        system_repo.commit_changes, request.chat_id, request.message
+    )
 
 
 @router.post("/push")
 async def push_changes(request: PushRequest, api_key: str = Depends(get_api_key)):
     """Envia as alterações para o GitHub."""
-    return system_repo.push_changes(request.chat_id)
+    return await asyncio.to_thread(system_repo.push_changes, request.chat_id)
 
 
 @router.post("/run_action/{workflow_name}")
@@ -401,7 +533,7 @@ async def execute_github_action(
             request.chat_id, request.repo_name
         )
         if error:
-            await send_telegram_message(request.chat_id, error)
+            _notify(request.chat_id, error)
             raise HTTPException(status_code=400, detail=error)
 
         # Obtém a URL remota do repositório
@@ -422,45 +554,357 @@ async def execute_github_action(
             }
         else:
             error_msg = f"Erro ao iniciar GitHub Action '{workflow_name}'."
-            await send_telegram_message(request.chat_id, error_msg)
+            _notify(request.chat_id, error_msg)
             raise HTTPException(status_code=500, detail=error_msg)
 
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Erro ao executar GitHub Action: {str(e)}"
-        await send_telegram_message(request.chat_id, error_msg)
+        _notify(request.chat_id, error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
 
+# Tamanho máximo de arquivo mantido no cache de leitura (1MB, mesmo limite do /cat)
+MAX_CACHED_FILE_SIZE = 1000000
+
+# Janela máxima de conteúdo de arquivo enviada ao Claude (32 KB);
+# arquivos maiores são truncados para conter custo e latência
+MAX_PROMPT_CONTENT = 32768
+
+# Tamanho mínimo de conteúdo a partir do qual vale marcar o prefixo para
+# cache de prompt (abaixo disso o mínimo de tokens cacheáveis não é atingido)
+PROMPT_CACHE_MIN_CHARS = 4096
+
+
+def _build_prompt_messages(
+    file_path: str, content: str, description: str, diff_mode: bool = False
+):
+    """Monta as mensagens do prompt separando o arquivo da instrução.
+
+    O bloco com o corpo do arquivo é estável entre iterações de /suggest no
+    mesmo arquivo; marcado com cache_control ephemeral, a Anthropic reaproveita
+    esse prefixo nas chamadas seguintes em vez de reprocessá-lo (e recobrá-lo).
+    Quando o arquivo muda em disco, o texto do bloco muda junto — a leitura é
+    chaveada por mtime — e o cache é invalidado naturalmente.
+    """
+    file_block = {
+        "type": "text",
+        "text": f"Aqui está o conteúdo do arquivo '{file_path}':\n\n```\n{content}\n```",
+    }
+    if len(content) >= PROMPT_CACHE_MIN_CHARS:
+        file_block["cache_control"] = {"type": "ephemeral"}
+
+    if diff_mode:
+        # Arquivos grandes: pedir só as alterações corta os tokens de
+        # resposta em ordem de grandeza em relação ao arquivo completo
+        instruction = (
+            "Por favor, responda com um diff unificado aplicável via git apply "
+            "(3 linhas de contexto, cabeçalhos "
+            f"'--- a/{file_path}' e '+++ b/{file_path}'), "
+            "contendo apenas as alterações, sem explicações adicionais."
+        )
+    else:
+        instruction = (
+            "Por favor, sugira o código modificado para atender a essa solicitação.\n"
+            "Forneça apenas o código completo modificado, sem explicações adicionais."
+        )
+
+    request_block = {
+        "type": "text",
+        "text": f"Modificação desejada: {description}\n\n{instruction}",
+    }
+    return [{"role": "user", "content": [file_block, request_block]}]
+
+
+# Arquivos com pelo menos este número de linhas são editados via diff
+DIFF_MODE_MIN_LINES = 500
+
+
+def _apply_unified_diff(repo_path: str, diff_text: str) -> bool:
+    """Aplica um diff unificado no repositório com git apply.
+
+    Retorna False quando o patch não casa com o arquivo atual (por
+    exemplo, se ele mudou desde a geração da sugestão).
+    """
+    if not diff_text.endswith("\n"):
+        diff_text += "\n"
+    result = subprocess.run(
+        ["git", "apply", "--whitespace=nowarn"],
+        input=diff_text.encode(),
+        cwd=repo_path,
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        logger.error("git apply falhou: %s", result.stderr.decode(errors="replace"))
+    return result.returncode == 0
+
+
+# Triagem de modelo: arquivos pequenos e pedidos triviais vão para o Haiku,
+# mais barato e mais rápido; o restante segue no Sonnet com o budget cheio
+MODEL_DEFAULT = "claude-3-7-sonnet-20250219"
+MODEL_LIGHT = "claude-3-5-haiku-20241022"
+LIGHT_MAX_TOKENS = 1500
+DEFAULT_MAX_TOKENS = 4000
+_LIGHT_CONTENT_TOKENS = 800
+TRIVIAL_KEYWORDS = frozenset(
+    {"rename", "renomear", "typo", "format", "formatar", "lint", "docstring"}
+)
+
+
+def _route_model(content: str, description: str):
+    """Escolhe o modelo e o max_tokens para um pedido de sugestão.
+
+    Estima os tokens do arquivo em ~4 caracteres por token; abaixo do corte,
+    ou quando a descrição indica uma mudança trivial, a geração vai para o
+    modelo leve com um budget reduzido.
+    """
+    est_tokens = len(content) // 4
+    if est_tokens < _LIGHT_CONTENT_TOKENS or (
+        TRIVIAL_KEYWORDS & set(description.lower().split())
+    ):
+        return MODEL_LIGHT, LIGHT_MAX_TOKENS
+    return MODEL_DEFAULT, DEFAULT_MAX_TOKENS
+
+
+# Janela de coleta do lote de sugestões, tamanho máximo e intervalo de polling
+BATCH_WINDOW_SECONDS = 0.25
+BATCH_MAX_SIZE = 8
+BATCH_POLL_SECONDS = 5
+
+# Sugestões via lote são opt-in: custo menor, porém latência de minutos
+USE_BATCH_SUGGESTIONS = os.getenv("USE_BATCH_SUGGESTIONS") == "1"
+
+
+class SuggestionBatcher:
+    """Agrupa consultas de sugestão na Message Batches API da Anthropic.
+
+    Pedidos de /suggest que chegam dentro da mesma janela de coleta seguem
+    em um único lote, amortizando o overhead de rede por chamada e pagando
+    a tarifa reduzida de batch. O caminho interativo padrão continua usando
+    streaming; o lote é ativado via USE_BATCH_SUGGESTIONS=1.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+    async def submit(
+        self, messages, model: str = MODEL_DEFAULT, max_tokens: int = DEFAULT_MAX_TOKENS
+    ) -> str:
+        """Enfileira as mensagens de um prompt e aguarda o texto sugerido pelo lote."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((messages, model, max_tokens, future))
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+        return await future
+
+    async def _flush(self):
+        while not self.queue.empty():
+            batch = [self.queue.get_nowait()]
+
+            # Aguarda a janela de coleta para agrupar pedidos próximos
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + BATCH_WINDOW_SECONDS
+            while len(batch) < BATCH_MAX_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch):
+        requests_payload = [
+            {
+                "custom_id": str(i),
+                "params": {
+                    "model": model,
+                    "max_tokens": max_tokens,
+                    "messages": messages,
+                },
+            }
+            for i, (messages, model, max_tokens, _) in enumerate(batch)
+        ]
+
+        try:
+            job = await asyncio.to_thread(
+                self.client.messages.batches.create, requests=requests_payload
+            )
+
+            # Faz polling até o lote terminar de processar
+            while job.processing_status != "ended":
+                await asyncio.sleep(BATCH_POLL_SECONDS)
+                job = await asyncio.to_thread(
+                    self.client.messages.batches.retrieve, job.id
+                )
+
+            results = await asyncio.to_thread(
+                lambda: list(self.client.messages.batches.results(job.id))
+            )
+            by_id = {entry.custom_id: entry for entry in results}
+
+            for i, (_, _, _, future) in enumerate(batch):
+                entry = by_id.get(str(i))
+                if entry is not None and entry.result.type == "succeeded":
+                    future.set_result(entry.result.message.content[0].text)
+                else:
+                    future.set_exception(
+                        RuntimeError("O lote retornou erro para esta sugestão")
+                    )
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+suggestion_batcher = SuggestionBatcher(claude)
+
+# Consultas idênticas ao Claude em andamento compartilham a mesma Future:
+# só a primeira paga a chamada; as demais aguardam o mesmo resultado
+_claude_inflight: Dict[str, asyncio.Future] = {}
+
+# Respostas já concluídas ficam em cache por uma hora: repetir a mesma
+# pergunta sobre o mesmo conteúdo responde na hora, sem nova chamada à API
+_suggestion_cache: cachetools.TTLCache = cachetools.TTLCache(maxsize=512, ttl=3600)
+
+
+def _suggestion_key(content: str, description: str) -> str:
+    """Chave de cache/coalescência: hash BLAKE3 do conteúdo e da descrição."""
+    return blake3.blake3((content + "\x00" + description).encode()).hexdigest()
+
+
+@functools.lru_cache(maxsize=256)
+def _read_file_cached(path: str, mtime: float) -> str:
+    """Lê o conteúdo de um arquivo, com cache invalidado automaticamente via mtime."""
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+async def _stream_suggestion(
+    chat_id: str,
+    file_path: str,
+    messages: List[Dict[str, Any]],
+    model: str = MODEL_DEFAULT,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+) -> str:
+    """Gera a sugestão em streaming, editando uma mensagem de espaço reservado.
+
+    O usuário vê o primeiro trecho em ~1 segundo em vez de esperar a geração
+    completa; as edições são espaçadas para respeitar os limites do Telegram.
+    """
+    placeholder = await send_telegram_message(
+        chat_id, f"Gerando sugestão para '{file_path}'..."
+    )
+    message_id = (
+        placeholder.get("result", {}).get("message_id") if placeholder else None
+    )
+
+    chunks = []
+    shown = ""
+    last_edit = time.monotonic()
+    async with claude_async.messages.stream(
+        model=model,
+        max_tokens=max_tokens,
+        messages=messages,
+    ) as stream:
+        async for text in stream.text_stream:
+            chunks.append(text)
+
+            # Edições são espaçadas em >=1 s (e só quando o conteúdo
+            # visível mudou) para respeitar os limites do Telegram
+            if message_id is None or time.monotonic() - last_edit < 1.0:
+                continue
+            visible = "".join(chunks)[:4000]
+            if visible != shown:
+                await edit_telegram_message(chat_id, message_id, visible)
+                shown = visible
+                last_edit = time.monotonic()
+
+    return "".join(chunks)
+
+
 async def process_suggestion_request(
     file_path: str, description: str, chat_id: str, repo_path: str
 ):
     """Processa a solicitação de sugestão em segundo plano."""
     try:
-        # Lê o conteúdo do arquivo
+        # Lê o conteúdo do arquivo (cache evita reler do disco se não mudou)
         full_path = os.path.join(repo_path, file_path)
-        with open(full_path, "r", encoding="utf-8") as file:
-            content = file.read()
-
-        # Consulta o Claude para sugestões
-        prompt = f"""
-        Aqui está o conteúdo do arquivo '{file_path}':
-
-        ```
-        {content}
-        ```
-        Modificação desejada: {description}
-
-        Por favor, sugira o código modificado para atender a essa solicitação.
-        Forneça apenas o código completo modificado, sem explicações adicionais.
-        """
-
-        response = claude.messages.create(
-            model="claude-3-7-sonnet-20250219",
-            max_tokens=4000,
-            messages=[{"role": "user", "content": prompt}],
+        file_stat = os.stat(full_path)
+        if file_stat.st_size <= MAX_CACHED_FILE_SIZE:
+            content = await asyncio.to_thread(
+                _read_file_cached, full_path, file_stat.st_mtime
+            )
+        else:
+            async with aiofiles.open(full_path, "r", encoding="utf-8") as file:
+                content = await file.read()
+
+        # Trunca o conteúdo para a janela máxima antes de montar o prompt
+        if len(content) > MAX_PROMPT_CONTENT:
+            omitted = len(content) - MAX_PROMPT_CONTENT
+            content = (
+                content[:MAX_PROMPT_CONTENT]
+                + f"\n\n# [conteúdo truncado: {omitted} caracteres omitidos]"
+            )
+
+        # Consulta o Claude para sugestões, com triagem de modelo auditável;
+        # arquivos grandes pedem um diff em vez do arquivo completo
+        diff_mode = content.count("\n") + 1 >= DIFF_MODE_MIN_LINES
+        messages = _build_prompt_messages(file_path, content, description, diff_mode)
+        model, max_tokens = _route_model(content, description)
+        logger.info(
+            "Triagem de modelo para '%s': %s (max_tokens=%s)",
+            file_path,
+            model,
+            max_tokens,
         )
 
-        suggested_code = response.content[0].text
+        # Coalescência: requisições idênticas (mesmo conteúdo e descrição)
+        # dentro da janela de latência do Claude compartilham uma única chamada
+        coalesce_key = _suggestion_key(content, description)
+
+        cached = _suggestion_cache.get(coalesce_key)
+        inflight = _claude_inflight.get(coalesce_key)
+        if cached is not None:
+            suggested_code = cached
+        elif inflight is not None:
+            suggested_code = await inflight
+        elif USE_BATCH_SUGGESTIONS:
+            future = asyncio.get_running_loop().create_future()
+            _claude_inflight[coalesce_key] = future
+            try:
+                # Via econômica: agrupa a consulta em um lote na API da Anthropic
+                suggested_code = await suggestion_batcher.submit(
+                    messages, model, max_tokens
+                )
+                future.set_result(suggested_code)
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                _claude_inflight.pop(coalesce_key, None)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            _claude_inflight[coalesce_key] = future
+            try:
+                suggested_code = await _stream_suggestion(
+                    chat_id, file_path, messages, model, max_tokens
+                )
+                future.set_result(suggested_code)
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                _claude_inflight.pop(coalesce_key, None)
+
+        _suggestion_cache[coalesce_key] = suggested_code
 
         # Extrai o código da resposta
         if "```" in suggested_code:
@@ -470,7 +914,7 @@ async def process_suggestion_request(
                 # Pega o conteúdo do primeiro bloco de código
                 suggested_code = parts[1]
                 if suggested_code.startswith(
-                    ("python", "javascript", "java", "typescript")
+                    ("python", "javascript", "java", "typescript", "diff")
                 ):
                     suggested_code = suggested_code.split("\n", 1)[1]
 
@@ -483,6 +927,7 @@ async def process_suggestion_request(
             "description": description,
             "chat_id": chat_id,
             "repo_path": repo_path,
+            "diff": diff_mode,
         }
 
         # Envia a sugestão para o usuário
@@ -500,6 +945,3 @@ async def process_suggestion_request(
         error_msg = f"Erro ao gerar sugestão: {str(e)}"
         await send_telegram_message(chat_id, error_msg)
         logger.error(error_msg)
-
-
-import os
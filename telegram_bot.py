@@ -1,10 +1,18 @@
 import asyncio
+import functools
+import io
 import logging
 import os
+import stat
 import tempfile
+import time
+from collections import OrderedDict
 
-from telegram import Update
+import aiofiles
+from telegram import InputFile, Update
+from telegram.error import RetryAfter
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     ContextTypes,
@@ -14,7 +22,7 @@ from telegram.ext import (
 
 from screenshot_utils import capture_directory_structure, capture_file_content
 from security.secure_mcp_client import SecureMCPClient
-from utils.common import get_connection_config, get_env_var
+from utils.common import get_connection_config, get_env_var, update_env_var
 
 # Configuração de logging
 logging.basicConfig(
@@ -31,18 +39,8 @@ MCP_PORT = config["mcp_port"]
 # Inicializa o cliente MCP
 mcp_client = SecureMCPClient()
 
-
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Envia mensagem quando o comando /start é emitido."""
-    await update.message.reply_text(
-        "Olá! Sou seu assistente de desenvolvimento. Posso te ajudar a modificar "
-        "seu repositório GitHub usando o Claude. Use /help para ver os comandos disponíveis."
-    )
-
-
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Envia mensagem de ajuda quando o comando /help é emitido."""
-    help_text = """
+# Textos estáticos construídos uma única vez no módulo
+HELP_TEXT = """
     Comandos disponíveis:
     /start - Inicia o bot
     /help - Mostra esta mensagem de ajuda
@@ -66,752 +64,1032 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     /branch - Mostra as branches do repositório
     /checkout <branch> - Muda para outra branch
     """
-    await update.message.reply_text(help_text)
 
+REPOS_LIST_HEADER = "Repositórios disponíveis:\n\n"
 
-async def repos_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Lista todos os repositórios disponíveis."""
+NO_REPO_SELECTED = (
+    "Nenhum repositório selecionado. Use /repos para listar e /select para escolher um."
+)
+
+
+# Cache LRU dos PNGs de estrutura de diretórios, invalidado via assinatura de mtime
+_screenshot_cache = OrderedDict()
+_SCREENSHOT_CACHE_SIZE = 64
+
+
+def _dir_signature(path, max_entries=512):
+    """Assinatura barata de um diretório: maior mtime entre os itens visitados.
+
+    A varredura é limitada a max_entries itens para que a assinatura não
+    custe mais do que a geração da captura em árvores muito grandes.
+    """
+    latest = 0
+    count = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in dirs + files:
+            try:
+                latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+            except OSError:
+                continue
+            count += 1
+            if count >= max_entries:
+                return latest
+    return latest
+
+
+class ChatSender:
+    """Fila FIFO de envio por chat com backoff adaptativo em caso de 429.
+
+    As mensagens de um chat são entregues em ordem por um worker único;
+    quando o Telegram responde RetryAfter, o worker aguarda a janela
+    indicada e reenvia, sem descartar mensagens nem entrar em retry loop.
+    """
+
+    _senders = {}
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=100)
+        self._task = None
+
+    @classmethod
+    def for_chat(cls, chat_id) -> "ChatSender":
+        sender = cls._senders.get(chat_id)
+        if sender is None:
+            sender = cls._senders[chat_id] = cls()
+        return sender
+
+    async def send(self, fn, *args, **kwargs):
+        """Enfileira um envio e aguarda a entrega (ou o erro) dele."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((fn, args, kwargs, future))
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+        return await future
+
+    async def _drain(self):
+        while not self.queue.empty():
+            fn, args, kwargs, future = self.queue.get_nowait()
+            try:
+                future.set_result(await fn(*args, **kwargs))
+            except RetryAfter as e:
+                # Aguarda a janela indicada pelo Telegram e reenvia uma vez
+                await asyncio.sleep(e.retry_after)
+                try:
+                    future.set_result(await fn(*args, **kwargs))
+                except Exception as err:
+                    future.set_exception(err)
+            except Exception as e:
+                future.set_exception(e)
+
+
+async def send_text(update: Update, *args, **kwargs):
+    """reply_text com fila FIFO por chat; a vazão é regulada pelo AIORateLimiter."""
+    return await ChatSender.for_chat(update.effective_chat.id).send(
+        update.message.reply_text, *args, **kwargs
+    )
+
+
+async def send_photo(update: Update, *args, **kwargs):
+    """reply_photo com fila FIFO por chat; a vazão é regulada pelo AIORateLimiter."""
+    return await ChatSender.for_chat(update.effective_chat.id).send(
+        update.message.reply_photo, *args, **kwargs
+    )
+
+
+async def send_document(update: Update, *args, **kwargs):
+    """reply_document com fila FIFO por chat; a vazão é regulada pelo AIORateLimiter."""
+    return await ChatSender.for_chat(update.effective_chat.id).send(
+        update.message.reply_document, *args, **kwargs
+    )
+
+
+# Acima deste tamanho a saída segue como anexo em vez de mensagem de texto
+_LONG_REPLY_THRESHOLD = 3500
+
+
+async def _reply_long(update: Update, text: str, name: str, caption=None, language=""):
+    """Envia saídas longas como documento em vez de truncá-las.
+
+    Mensagens do Telegram têm limite de 4096 caracteres; acima do limiar o
+    conteúdo completo segue como anexo, evitando perda de informação e o
+    reenvio do comando com parâmetros menores.
+    """
+    if len(text) <= _LONG_REPLY_THRESHOLD:
+        header = f"{caption}\n\n" if caption else ""
+        await send_text(
+            update, f"{header}```{language}\n{text}\n```", parse_mode="Markdown"
+        )
+    else:
+        await send_document(
+            update,
+            document=InputFile(io.BytesIO(text.encode()), filename=name),
+            caption=caption,
+        )
+
+
+async def _rpc(fn, *args, **kwargs):
+    """Executa uma chamada bloqueante do cliente MCP fora do event loop.
+
+    O SecureMCPClient usa I/O HTTP síncrono; rodá-lo em uma thread evita
+    que uma requisição em andamento trave o atendimento dos demais usuários.
+    """
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+# Requisições idênticas em andamento compartilham a mesma Future (single-flight)
+_inflight = {}
+
+
+async def _single_flight(key, coro_factory):
+    """Coalesce chamadas idênticas concorrentes em uma única execução.
+
+    Se já há uma requisição em andamento com a mesma chave (ex.: o usuário
+    repetiu /status várias vezes), aguarda o resultado dela em vez de
+    disparar outra chamada ao MCP Server.
+    """
+    existing = _inflight.get(key)
+    if existing is not None:
+        return await existing
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
     try:
-        user_id = str(update.effective_user.id)
+        result = await coro_factory()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        _inflight.pop(key, None)
 
-        # Consulta o MCP Server para listar os repositórios
-        response = mcp_client.list_repos(user_id)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao listar repositórios: {response['error']}"
-            )
+def rpc_handler(action):
+    """Centraliza o tratamento de erros dos handlers de comando.
+
+    Cada handler repetia o mesmo bloco try/except com uma mensagem
+    "Erro ao <ação>"; o decorator concentra logging e resposta ao usuário
+    em um único caminho de exceção.
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            try:
+                return await fn(update, context)
+            except Exception as e:
+                logger.exception("Erro ao %s", action)
+                await send_text(update, f"Erro ao {action}: {str(e)}")
+
+        return wrapper
+
+    return decorator
+
+
+# Quantidade máxima de sugestões retidas por usuário (evita crescimento sem limite)
+_MAX_SUGGESTIONS = 20
+
+# Extensões tratadas como código ao formatar blocos no Telegram
+_CODE_EXTS = frozenset(
+    {
+        "py",
+        "js",
+        "java",
+        "c",
+        "cpp",
+        "cs",
+        "php",
+        "go",
+        "ts",
+        "html",
+        "css",
+        "json",
+        "xml",
+    }
+)
+
+
+def _probe_file(repo_path, current_path, file_arg):
+    """Resolve o caminho de um arquivo e coleta existência/tamanho de uma vez.
+
+    Um único os.stat substitui os pares isfile/getsize, e a função roda
+    em thread para não bloquear o event loop em discos lentos.
+    """
+    rel = os.path.normpath(os.path.join(current_path, file_arg))
+    ab = os.path.join(repo_path, rel)
+    try:
+        st = os.stat(ab)
+    except OSError:
+        return rel, ab, False, 0
+    return rel, ab, stat.S_ISREG(st.st_mode), st.st_size
+
+
+# Validade do cache de diretório atual por usuário (segundos)
+_CWD_CACHE_TTL = 60
+
+
+async def _current_directory(user_id, context: ContextTypes.DEFAULT_TYPE):
+    """Obtém o diretório atual do usuário com um cache curto em memória.
+
+    Evita uma ida e volta ao MCP Server por mensagem; o cache é invalidado
+    nos comandos que alteram o estado de navegação (/cd, /select, /checkout).
+    """
+    cached = context.user_data.get("_cwd")
+    if cached and time.monotonic() - cached[1] < _CWD_CACHE_TTL:
+        return cached[0]
+
+    response = await _rpc(mcp_client.get_current_directory, user_id)
+    if response.get("status") == "success":
+        context.user_data["_cwd"] = (response, time.monotonic())
+    return response
+
+
+def require_repo(fn):
+    """Garante um repositório selecionado antes de executar o handler.
+
+    Concentra o caminho negativo em um único lugar: sem repositório, o
+    usuário recebe NO_REPO_SELECTED e o handler nem chega a rodar; com
+    repositório, o handler recebe a resposta (cacheada) de /pwd já
+    resolvida, sem repetir a consulta.
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user_id = str(update.effective_user.id)
+        response = await _current_directory(user_id, context)
+        if "error" in response or response.get("status") != "success":
+            await send_text(update, NO_REPO_SELECTED)
             return
+        return await fn(update, context, response)
 
-        repos = response.get("repos", [])
+    return wrapper
 
-        repos_list = "Repositórios disponíveis:\n\n"
-        for i, repo_name in enumerate(repos, 1):
-            repos_list += f"{i}. {repo_name}\n"
 
-        repos_list += "\nUse /select <nome_repo> para selecionar um repositório."
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Envia mensagem quando o comando /start é emitido."""
+    await send_text(
+        update,
+        "Olá! Sou seu assistente de desenvolvimento. Posso te ajudar a modificar "
+        "seu repositório GitHub usando o Claude. Use /help para ver os comandos disponíveis.",
+    )
 
-        await update.message.reply_text(repos_list)
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao listar repositórios: {str(e)}")
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Envia mensagem de ajuda quando o comando /help é emitido."""
+    await send_text(update, HELP_TEXT)
 
 
+@rpc_handler("listar repositórios")
+async def repos_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Lista todos os repositórios disponíveis."""
+    user_id = str(update.effective_user.id)
+
+    # Consulta o MCP Server para listar os repositórios
+    response = await _single_flight(
+        ("repos", user_id), lambda: _rpc(mcp_client.list_repos, user_id)
+    )
+
+    if "error" in response:
+        await send_text(update, f"Erro ao listar repositórios: {response['error']}")
+        return
+
+    repos = response.get("repos", [])
+
+    repos_list = REPOS_LIST_HEADER
+    for i, repo_name in enumerate(repos, 1):
+        repos_list += f"{i}. {repo_name}\n"
+
+    repos_list += "\nUse /select <nome_repo> para selecionar um repositório."
+
+    await send_text(update, repos_list)
+
+
+@rpc_handler("selecionar repositório")
 async def select_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Seleciona um repositório para trabalhar."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        if not context.args:
-            await update.message.reply_text(
-                "Por favor, especifique o nome do repositório.\nUso: /select <nome_repo>"
-            )
-            return
+    if not context.args:
+        await send_text(
+            update,
+            "Por favor, especifique o nome do repositório.\nUso: /select <nome_repo>",
+        )
+        return
 
-        repo_name = context.args[0]
+    repo_name = context.args[0]
 
-        # Solicita ao MCP Server para selecionar o repositório
-        response = mcp_client.select_repo(user_id, repo_name)
+    # Solicita ao MCP Server para selecionar o repositório
+    response = await _rpc(mcp_client.select_repo, user_id, repo_name)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao selecionar repositório: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao selecionar repositório: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            await update.message.reply_text(
-                f"Repositório '{repo_name}' selecionado com sucesso!\n"
-                f"Use /ls para listar arquivos e diretórios ou /status para ver o status do Git."
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao selecionar repositório.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao selecionar repositório: {str(e)}")
+    if response.get("status") == "success":
+        context.user_data.pop("_cwd", None)
+        # Pré-busca especulativa: /select costuma ser seguido de /tree,
+        # então a árvore padrão já fica pronta quando o comando chegar
+        context.user_data["_prefetch_tree"] = asyncio.create_task(
+            _rpc(mcp_client.get_tree, user_id, 2, [])
+        )
+        await send_text(
+            update,
+            f"Repositório '{repo_name}' selecionado com sucesso!\n"
+            f"Use /ls para listar arquivos e diretórios ou /status para ver o status do Git.",
+        )
+    else:
+        await send_text(
+            update, response.get("message", "Erro ao selecionar repositório.")
+        )
 
 
+@rpc_handler("listar diretório")
 async def ls_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Lista arquivos e pastas do diretório atual ou do caminho especificado."""
-    try:
-        user_id = str(update.effective_user.id)
-        path_arg = " ".join(context.args) if context.args else ""
+    user_id = str(update.effective_user.id)
+    path_arg = " ".join(context.args) if context.args else ""
 
-        # Consulta o MCP Server para listar os arquivos
-        response = mcp_client.list_files(user_id, path_arg)
+    # Consulta o MCP Server para listar os arquivos
+    response = await _rpc(mcp_client.list_files, user_id, path_arg)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao listar diretório: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao listar diretório: {response['error']}")
+        return
 
-        if response.get("status") == "error":
-            await update.message.reply_text(
-                response.get("message", "Erro ao listar diretório.")
-            )
-            return
+    if response.get("status") == "error":
+        await send_text(update, response.get("message", "Erro ao listar diretório."))
+        return
 
-        # Formata e envia a resposta
-        directories = response.get("directories", [])
-        files = response.get("files", [])
-        current_path = response.get("current_path", "/")
+    # Formata e envia a resposta
+    directories = response.get("directories", [])
+    files = response.get("files", [])
+    current_path = response.get("current_path", "/")
 
-        message = f"📂 Conteúdo de '{current_path}':\n\n"
+    message = f"📂 Conteúdo de '{current_path}':\n\n"
 
-        if directories:
-            message += (
-                "Diretórios:\n" + "\n".join([f"📁 {d}" for d in directories]) + "\n\n"
-            )
+    if directories:
+        message += "Diretórios:\n" + "\n".join(f"📁 {d}" for d in directories) + "\n\n"
 
-        if files:
-            message += "Arquivos:\n" + "\n".join([f"📄 {f}" for f in files])
+    if files:
+        message += "Arquivos:\n" + "\n".join(f"📄 {f}" for f in files)
 
-        if not directories and not files:
-            message += "Diretório vazio"
+    if not directories and not files:
+        message += "Diretório vazio"
 
-        await update.message.reply_text(message)
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao listar diretório: {str(e)}")
+    await send_text(update, message)
 
 
+@rpc_handler("navegar para o diretório")
 async def cd_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Navega para o diretório especificado."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        if not context.args:
-            await update.message.reply_text(
-                "Por favor, especifique o caminho.\nUso: /cd <caminho>"
-            )
-            return
-
-        path_arg = " ".join(context.args)
+    if not context.args:
+        await send_text(update, "Por favor, especifique o caminho.\nUso: /cd <caminho>")
+        return
 
-        # Solicita ao MCP Server para mudar o diretório
-        response = mcp_client.change_directory(user_id, path_arg, context.args)
+    path_arg = " ".join(context.args)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao navegar para o diretório: {response['error']}"
-            )
-            return
+    # Solicita ao MCP Server para mudar o diretório
+    response = await _rpc(mcp_client.change_directory, user_id, path_arg, context.args)
 
-        if response.get("status") == "success":
-            new_path = response.get("current_path", "/")
-            await update.message.reply_text(f"Navegado para '{new_path}'")
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao navegar para o diretório.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao navegar para o diretório: {str(e)}")
+    if "error" in response:
+        await send_text(
+            update, f"Erro ao navegar para o diretório: {response['error']}"
+        )
+        return
+
+    if response.get("status") == "success":
+        context.user_data.pop("_cwd", None)
+        new_path = response.get("current_path", "/")
+        await send_text(update, f"Navegado para '{new_path}'")
+    else:
+        await send_text(
+            update, response.get("message", "Erro ao navegar para o diretório.")
+        )
 
 
+@rpc_handler("mostrar diretório atual")
 async def pwd_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mostra o diretório atual."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Consulta o MCP Server para obter o diretório atual
-        response = mcp_client.get_current_directory(user_id, context.args)
+    # Consulta o MCP Server para obter o diretório atual
+    response = await _single_flight(
+        ("pwd", user_id),
+        lambda: _rpc(mcp_client.get_current_directory, user_id, context.args),
+    )
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao mostrar diretório atual: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao mostrar diretório atual: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            repo_name = response.get("repo_name", "")
-            current_dir = response.get("current_path", "/")
+    if response.get("status") == "success":
+        repo_name = response.get("repo_name", "")
+        current_dir = response.get("current_path", "/")
 
-            await update.message.reply_text(
-                f"Repositório: {repo_name}\n" f"Diretório atual: {current_dir}"
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao mostrar diretório atual.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao mostrar diretório atual: {str(e)}")
+        await send_text(
+            update, f"Repositório: {repo_name}\n" f"Diretório atual: {current_dir}"
+        )
+    else:
+        await send_text(
+            update, response.get("message", "Erro ao mostrar diretório atual.")
+        )
 
 
+@rpc_handler("gerar árvore")
 async def tree_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mostra a estrutura de diretórios."""
-    try:
-        user_id = str(update.effective_user.id)
-
-        # Determina a profundidade
-        max_depth = 2  # Padrão
-        if context.args:
-            try:
-                max_depth = int(context.args[0])
-                # Limita a profundidade para evitar mensagens muito grandes
-                if max_depth > 4:
-                    max_depth = 4
-                    await update.message.reply_text(
-                        "Profundidade máxima limitada a 4 para evitar excesso de dados."
-                    )
-            except ValueError:
-                await update.message.reply_text(
-                    "Profundidade inválida. Usando valor padrão (2)."
+    user_id = str(update.effective_user.id)
+
+    # Determina a profundidade
+    max_depth = 2  # Padrão
+    if context.args:
+        try:
+            max_depth = int(context.args[0])
+            # Limita a profundidade para evitar mensagens muito grandes
+            if max_depth > 4:
+                max_depth = 4
+                await send_text(
+                    update,
+                    "Profundidade máxima limitada a 4 para evitar excesso de dados.",
                 )
-
+        except ValueError:
+            await send_text(update, "Profundidade inválida. Usando valor padrão (2).")
+
+    # Aproveita a árvore pré-buscada no /select, quando aplicável
+    prefetch = context.user_data.pop("_prefetch_tree", None)
+    if prefetch is not None and max_depth == 2:
+        response = await prefetch
+    else:
+        if prefetch is not None:
+            prefetch.cancel()
         # Consulta o MCP Server para obter a estrutura de diretórios
-        response = mcp_client.get_tree(user_id, max_depth, context.args)
-
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao gerar árvore: {response['error']}"
-            )
-            return
+        response = await _single_flight(
+            ("tree", user_id, max_depth),
+            lambda: _rpc(mcp_client.get_tree, user_id, max_depth, context.args),
+        )
 
-        if response.get("status") == "success":
-            tree_output = response.get("tree", "")
+    if "error" in response:
+        await send_text(update, f"Erro ao gerar árvore: {response['error']}")
+        return
 
-            # Verifica se a saída não é muito longa para o Telegram
-            if len(tree_output) > 4000:
-                tree_output = (
-                    tree_output[:3900]
-                    + "\n\n... (saída truncada, use profundidade menor)"
-                )
+    if response.get("status") == "success":
+        tree_output = response.get("tree", "")
 
-            await update.message.reply_text(
-                f"```\n{tree_output}\n```", parse_mode="Markdown"
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao gerar árvore.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao gerar árvore: {str(e)}")
+        # Saídas longas seguem como anexo em vez de truncadas
+        await _reply_long(update, tree_output, "tree.txt")
+    else:
+        await send_text(update, response.get("message", "Erro ao gerar árvore."))
 
 
+@rpc_handler("mostrar arquivo")
 async def cat_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mostra o conteúdo de um arquivo."""
-    try:
-        user_id = str(update.effective_user.id)
-
-        if not context.args:
-            await update.message.reply_text(
-                "Por favor, especifique o arquivo.\nUso: /cat <arquivo>"
-            )
-            return
-
-        file_path = " ".join(context.args)
-
-        # Consulta o MCP Server para obter o conteúdo do arquivo
-        response = mcp_client.get_file_content(user_id, file_path)
-
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao mostrar arquivo: {response['error']}"
-            )
-            return
+    user_id = str(update.effective_user.id)
 
-        if response.get("status") == "success":
-            content = response.get("content", "")
-            file_type = response.get("file_type", "")
-            file_path = response.get("file_path", "")
-
-            # Limita o tamanho do conteúdo
-            if len(content) > 4000:
-                content = content[:3900] + "\n\n... (conteúdo truncado)"
-
-            # Determina o tipo de arquivo para formatação adequada
-            language = ""
-            if file_type in [
-                "py",
-                "js",
-                "java",
-                "c",
-                "cpp",
-                "cs",
-                "php",
-                "go",
-                "ts",
-                "html",
-                "css",
-                "json",
-                "xml",
-            ]:
-                language = file_type
-
-            message = f"📄 {file_path}:\n\n```{language}\n{content}\n```"
-
-            await update.message.reply_text(message, parse_mode="Markdown")
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao mostrar arquivo.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao mostrar arquivo: {str(e)}")
+    if not context.args:
+        await send_text(
+            update, "Por favor, especifique o arquivo.\nUso: /cat <arquivo>"
+        )
+        return
+
+    file_path = " ".join(context.args)
+
+    # Consulta o MCP Server para obter o conteúdo do arquivo
+    response = await _rpc(mcp_client.get_file_content, user_id, file_path)
+
+    if "error" in response:
+        await send_text(update, f"Erro ao mostrar arquivo: {response['error']}")
+        return
+
+    if response.get("status") == "success":
+        content = response.get("content", "")
+        file_type = response.get("file_type", "")
+        file_path = response.get("file_path", "")
+
+        # Determina o tipo de arquivo para formatação adequada
+        language = ""
+        if file_type in _CODE_EXTS:
+            language = file_type
+
+        # Arquivos grandes seguem como anexo em vez de truncados
+        await _reply_long(
+            update,
+            content,
+            os.path.basename(file_path) or "arquivo.txt",
+            caption=f"📄 {file_path}:",
+            language=language,
+        )
+    else:
+        await send_text(update, response.get("message", "Erro ao mostrar arquivo."))
 
 
+@rpc_handler("verificar status")
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Verifica o status do repositório."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Consulta o MCP Server para obter o status do repositório
-        response = mcp_client.get_status(user_id)
+    # Consulta o MCP Server para obter o status do repositório
+    response = await _single_flight(
+        ("status", user_id), lambda: _rpc(mcp_client.get_status, user_id)
+    )
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao verificar status: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao verificar status: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            git_status = response.get("data", "")
+    if response.get("status") == "success":
+        git_status = response.get("data", "")
 
-            await update.message.reply_text(
-                f"Status do repositório:\n```\n{git_status}\n```", parse_mode="Markdown"
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao verificar status.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao verificar status: {str(e)}")
+        await _reply_long(
+            update, git_status, "status.txt", caption="Status do repositório:"
+        )
+    else:
+        await send_text(update, response.get("message", "Erro ao verificar status."))
 
 
+@rpc_handler("listar branches")
 async def branch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Mostra as branches do repositório."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Consulta o MCP Server para obter as branches
-        response = mcp_client.get_branches(user_id)
+    # Consulta o MCP Server para obter as branches
+    response = await _single_flight(
+        ("branch", user_id), lambda: _rpc(mcp_client.get_branches, user_id)
+    )
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao listar branches: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao listar branches: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            branches = response.get("branches", [])
-            branches_str = "\n".join(branches)
+    if response.get("status") == "success":
+        branches = response.get("branches", [])
+        branches_str = "\n".join(branches)
 
-            await update.message.reply_text(
-                f"Branches do repositório:\n```\n{branches_str}\n```",
-                parse_mode="Markdown",
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao listar branches.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao listar branches: {str(e)}")
+        await _reply_long(
+            update, branches_str, "branches.txt", caption="Branches do repositório:"
+        )
+    else:
+        await send_text(update, response.get("message", "Erro ao listar branches."))
 
 
+@rpc_handler("fazer checkout")
 async def checkout_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Muda para outra branch."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        if not context.args:
-            await update.message.reply_text(
-                "Por favor, especifique a branch.\nUso: /checkout <branch>"
-            )
-            return
+    if not context.args:
+        await send_text(
+            update, "Por favor, especifique a branch.\nUso: /checkout <branch>"
+        )
+        return
 
-        branch_name = context.args[0]
+    branch_name = context.args[0]
 
-        # Solicita ao MCP Server para fazer checkout
-        response = mcp_client.checkout_branch(user_id, branch_name, context.args)
+    # Solicita ao MCP Server para fazer checkout
+    response = await _rpc(
+        mcp_client.checkout_branch, user_id, branch_name, context.args
+    )
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao fazer checkout: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao fazer checkout: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            await update.message.reply_text(f"Alterado para branch: {branch_name}")
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao fazer checkout.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao fazer checkout: {str(e)}")
+    if response.get("status") == "success":
+        context.user_data.pop("_cwd", None)
+        await send_text(update, f"Alterado para branch: {branch_name}")
+    else:
+        await send_text(update, response.get("message", "Erro ao fazer checkout."))
 
 
+@rpc_handler("gerar sugestão")
 async def suggest_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Solicita ao Claude sugestões para modificar um arquivo."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Verifica se foram fornecidos argumentos suficientes
-        if len(context.args) < 2:
-            await update.message.reply_text(
-                "Uso: /suggest <arquivo> <descrição da modificação desejada>"
-            )
-            return
+    # Verifica se foram fornecidos argumentos suficientes
+    if len(context.args) < 2:
+        await send_text(
+            update, "Uso: /suggest <arquivo> <descrição da modificação desejada>"
+        )
+        return
 
-        file_path = context.args[0]
-        description = " ".join(context.args[1:])
+    file_path = context.args[0]
+    description = " ".join(context.args[1:])
 
-        await update.message.reply_text(
-            "Consultando Claude para sugestões de modificação. Aguarde um momento..."
-        )
+    await send_text(
+        update,
+        "Consultando Claude para sugestões de modificação. Aguarde um momento...",
+    )
 
-        # Solicita ao MCP Server para gerar sugestões
-        response = mcp_client.suggest_modification(user_id, file_path, description)
+    # Solicita ao MCP Server para gerar sugestões
+    response = await _rpc(
+        mcp_client.suggest_modification, user_id, file_path, description
+    )
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao gerar sugestão: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao gerar sugestão: {response['error']}")
+        return
 
-        if response.get("status") == "processing":
-            # O processamento está sendo feito em segundo plano no MCP Server
-            await update.message.reply_text(
-                "A solicitação está sendo processada. Você receberá a sugestão em breve."
-            )
-        elif response.get("status") == "success":
-            suggestion_id = response.get("suggestion_id", "")
-            suggested_code = response.get("suggested_code", "")
-
-            # Armazena a sugestão no contexto do usuário para uso posterior
-            if "suggestions" not in context.user_data:
-                context.user_data["suggestions"] = {}
-
-            context.user_data["suggestions"][suggestion_id] = {
-                "file_path": file_path,
-                "description": description,
-            }
-
-            # Envia a sugestão para o usuário
-            await update.message.reply_text(
-                f"Sugestão #{suggestion_id} para '{file_path}':\n\n"
-                f"```\n{suggested_code[:1000]}...\n```\n\n"
-                f"(Mostrando apenas os primeiros 1000 caracteres)\n\n"
-                f"Para aplicar: /apply {suggestion_id}\n"
-                f"Para rejeitar: /reject {suggestion_id}",
-                parse_mode="Markdown",
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao gerar sugestão.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao gerar sugestão: {str(e)}")
+    if response.get("status") == "processing":
+        # O processamento está sendo feito em segundo plano no MCP Server
+        await send_text(
+            update,
+            "A solicitação está sendo processada. Você receberá a sugestão em breve.",
+        )
+    elif response.get("status") == "success":
+        suggestion_id = response.get("suggestion_id", "")
+        suggested_code = response.get("suggested_code", "")
+
+        # Armazena apenas o preview no contexto do usuário; o texto
+        # completo fica no MCP Server, chaveado pelo suggestion_id
+        if "suggestions" not in context.user_data:
+            context.user_data["suggestions"] = OrderedDict()
+
+        suggestions = context.user_data["suggestions"]
+        suggestions[suggestion_id] = {
+            "file_path": file_path,
+            "description": description,
+            "preview": suggested_code[:1000],
+        }
+        suggestions.move_to_end(suggestion_id)
+        while len(suggestions) > _MAX_SUGGESTIONS:
+            suggestions.popitem(last=False)
+
+        # Envia a sugestão para o usuário
+        await send_text(
+            update,
+            f"Sugestão #{suggestion_id} para '{file_path}':\n\n"
+            f"```\n{suggested_code[:1000]}...\n```\n\n"
+            f"(Mostrando apenas os primeiros 1000 caracteres)\n\n"
+            f"Para aplicar: /apply {suggestion_id}\n"
+            f"Para rejeitar: /reject {suggestion_id}",
+            parse_mode="Markdown",
+        )
+    else:
+        await send_text(update, response.get("message", "Erro ao gerar sugestão."))
 
 
+@rpc_handler("aplicar sugestão")
 async def apply_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Aplica a sugestão proposta pelo Claude."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Verifica se foi fornecido um ID de sugestão
-        if len(context.args) < 1:
-            await update.message.reply_text("Uso: /apply <id_sugestão>")
-            return
+    # Verifica se foi fornecido um ID de sugestão
+    if len(context.args) < 1:
+        await send_text(update, "Uso: /apply <id_sugestão>")
+        return
 
-        # Obtém o ID da sugestão
-        suggestion_id = context.args[0]
+    # Obtém o ID da sugestão
+    suggestion_id = context.args[0]
 
-        # Solicita ao MCP Server para aplicar a sugestão
-        response = mcp_client.apply_modification(user_id, suggestion_id)
+    # Solicita ao MCP Server para aplicar a sugestão
+    response = await _rpc(mcp_client.apply_modification, user_id, suggestion_id)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao aplicar sugestão: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao aplicar sugestão: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            file_path = response.get("file_path", "")
+    if response.get("status") == "success":
+        file_path = response.get("file_path", "")
 
-            await update.message.reply_text(
-                f"Sugestão #{suggestion_id} aplicada com sucesso ao arquivo '{file_path}'.\n"
-                f"Use /commit para confirmar as alterações."
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao aplicar sugestão.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao aplicar sugestão: {str(e)}")
+        await send_text(
+            update,
+            f"Sugestão #{suggestion_id} aplicada com sucesso ao arquivo '{file_path}'.\n"
+            f"Use /commit para confirmar as alterações.",
+        )
+    else:
+        await send_text(update, response.get("message", "Erro ao aplicar sugestão."))
 
 
+@rpc_handler("rejeitar sugestão")
 async def reject_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Rejeita a sugestão proposta pelo Claude."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Verifica se foi fornecido um ID de sugestão
-        if len(context.args) < 1:
-            await update.message.reply_text("Uso: /reject <id_sugestão>")
-            return
+    # Verifica se foi fornecido um ID de sugestão
+    if len(context.args) < 1:
+        await send_text(update, "Uso: /reject <id_sugestão>")
+        return
 
-        # Obtém o ID da sugestão
-        suggestion_id = context.args[0]
+    # Obtém o ID da sugestão
+    suggestion_id = context.args[0]
 
-        # Solicita ao MCP Server para rejeitar a sugestão
-        response = mcp_client.reject_modification(user_id, suggestion_id)
+    # Solicita ao MCP Server para rejeitar a sugestão
+    response = await _rpc(mcp_client.reject_modification, user_id, suggestion_id)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao rejeitar sugestão: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao rejeitar sugestão: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            file_path = response.get("file_path", "")
+    if response.get("status") == "success":
+        file_path = response.get("file_path", "")
 
-            await update.message.reply_text(
-                f"Sugestão #{suggestion_id} para '{file_path}' foi rejeitada."
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao rejeitar sugestão.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao rejeitar sugestão: {str(e)}")
+        await send_text(
+            update, f"Sugestão #{suggestion_id} para '{file_path}' foi rejeitada."
+        )
+    else:
+        await send_text(update, response.get("message", "Erro ao rejeitar sugestão."))
 
 
+@rpc_handler("realizar commit")
 async def commit_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Realiza commit das alterações."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Verifica se foi fornecida uma mensagem de commit
-        if len(context.args) < 1:
-            await update.message.reply_text("Uso: /commit <mensagem>")
-            return
+    # Verifica se foi fornecida uma mensagem de commit
+    if len(context.args) < 1:
+        await send_text(update, "Uso: /commit <mensagem>")
+        return
 
-        # Obtém a mensagem de commit
-        commit_message = " ".join(context.args)
+    # Obtém a mensagem de commit
+    commit_message = " ".join(context.args)
 
-        # Solicita ao MCP Server para realizar o commit
-        response = mcp_client.commit_changes(user_id, commit_message)
+    # Solicita ao MCP Server para realizar o commit
+    response = await _rpc(mcp_client.commit_changes, user_id, commit_message)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao realizar commit: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao realizar commit: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            await update.message.reply_text(
-                f"Commit realizado com sucesso: '{commit_message}'.\n"
-                f"Use /push para enviar as alterações para o GitHub."
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao realizar commit.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao realizar commit: {str(e)}")
+    if response.get("status") == "success":
+        await send_text(
+            update,
+            f"Commit realizado com sucesso: '{commit_message}'.\n"
+            f"Use /push para enviar as alterações para o GitHub.",
+        )
+    else:
+        await send_text(update, response.get("message", "Erro ao realizar commit."))
 
 
+@rpc_handler("enviar alterações")
 async def push_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Envia as alterações para o GitHub."""
-    try:
-        user_id = str(update.effective_user.id)
+    user_id = str(update.effective_user.id)
 
-        # Solicita ao MCP Server para realizar o push
-        response = mcp_client.push_changes(user_id)
+    # Solicita ao MCP Server para realizar o push
+    response = await _rpc(mcp_client.push_changes, user_id)
 
-        if "error" in response:
-            await update.message.reply_text(
-                f"Erro ao enviar alterações: {response['error']}"
-            )
-            return
+    if "error" in response:
+        await send_text(update, f"Erro ao enviar alterações: {response['error']}")
+        return
 
-        if response.get("status") == "success":
-            await update.message.reply_text(
-                "Alterações enviadas com sucesso para o GitHub."
-            )
-        else:
-            await update.message.reply_text(
-                response.get("message", "Erro ao enviar alterações.")
-            )
-    except Exception as e:
-        await update.message.reply_text(f"Erro ao enviar alterações: {str(e)}")
+    if response.get("status") == "success":
+        await send_text(update, "Alterações enviadas com sucesso para o GitHub.")
+    else:
+        await send_text(update, response.get("message", "Erro ao enviar alterações."))
 
 
+@rpc_handler("capturar estrutura de diretórios")
+@require_repo
 async def screenshot_command(
-    update: Update, context: ContextTypes.DEFAULT_TYPE
+    update: Update, context: ContextTypes.DEFAULT_TYPE, response: dict
 ) -> None:
     """Captura e envia uma imagem da estrutura de diretórios."""
-    try:
-        user_id = str(update.effective_user.id)
 
-        # Verifica se um repositório foi selecionado
-        response = mcp_client.get_current_directory(user_id)
-
-        if "error" in response or response.get("status") != "success":
-            await update.message.reply_text(
-                "Nenhum repositório selecionado. Use /repos para listar e /select para escolher um."
-            )
-            return
-
-        # Determina a profundidade
-        max_depth = 3  # Padrão
-        if context.args:
-            try:
-                max_depth = int(context.args[0])
-                # Limita a profundidade para evitar imagens muito grandes
-                if max_depth > 5:
-                    max_depth = 5
-                    await update.message.reply_text(
-                        "Profundidade máxima limitada a 5 para evitar excesso de dados."
-                    )
-            except ValueError:
-                await update.message.reply_text(
-                    "Profundidade inválida. Usando valor padrão (3)."
+    # Determina a profundidade
+    max_depth = 3  # Padrão
+    if context.args:
+        try:
+            max_depth = int(context.args[0])
+            # Limita a profundidade para evitar imagens muito grandes
+            if max_depth > 5:
+                max_depth = 5
+                await send_text(
+                    update,
+                    "Profundidade máxima limitada a 5 para evitar excesso de dados.",
                 )
+        except ValueError:
+            await send_text(update, "Profundidade inválida. Usando valor padrão (3).")
 
-        repo_path = response.get("repo_path", "")
-        current_path = response.get("current_path", "")
+    repo_path = response.get("repo_path", "")
+    current_path = response.get("current_path", "")
 
-        current_abs_dir = os.path.join(repo_path, current_path)
+    current_abs_dir = os.path.join(repo_path, current_path)
 
-        # Informa ao usuário que a captura está sendo gerada
-        await update.message.reply_text(
-            "Gerando captura da estrutura de diretórios. Aguarde um momento..."
+    # Avisa o usuário enquanto a assinatura do diretório é calculada; a fila
+    # FIFO por chat garante que o aviso chega antes da foto
+    _, signature = await asyncio.gather(
+        send_text(
+            update, "Gerando captura da estrutura de diretórios. Aguarde um momento..."
+        ),
+        asyncio.to_thread(_dir_signature, current_abs_dir),
+    )
+    cache_key = (current_abs_dir, max_depth, signature)
+    photo_data = _screenshot_cache.get(cache_key)
+
+    if photo_data is not None:
+        _screenshot_cache.move_to_end(cache_key)
+    else:
+        # Gera a captura fora do event loop (renderização PIL é bloqueante)
+        screenshot_path = await asyncio.to_thread(
+            capture_directory_structure, current_abs_dir
         )
 
-        # Gera a captura
-        screenshot_path = capture_directory_structure(current_abs_dir)
-
-        if screenshot_path:
-            # Envia a imagem pelo Telegram
-            await update.message.reply_photo(
-                photo=open(screenshot_path, "rb"),
-                caption=f"Estrutura de diretórios: {os.path.basename(current_abs_dir) or response.get('repo_name', '')}",
-            )
-
-            # Remove o arquivo temporário
-            os.unlink(screenshot_path)
-        else:
-            await update.message.reply_text(
-                "Não foi possível gerar a captura da estrutura de diretórios."
+        if not screenshot_path:
+            await send_text(
+                update,
+                "Não foi possível gerar a captura da estrutura de diretórios.",
             )
+            return
 
-    except Exception as e:
-        await update.message.reply_text(
-            f"Erro ao capturar estrutura de diretórios: {str(e)}"
-        )
+        try:
+            # Lê a imagem sem bloquear o event loop
+            async with aiofiles.open(screenshot_path, "rb") as f:
+                photo_data = await f.read()
+        finally:
+            # Remove o arquivo temporário mesmo em caso de erro na leitura
+            if os.path.exists(screenshot_path):
+                await asyncio.to_thread(os.unlink, screenshot_path)
+
+        _screenshot_cache[cache_key] = photo_data
+        if len(_screenshot_cache) > _SCREENSHOT_CACHE_SIZE:
+            _screenshot_cache.popitem(last=False)
+
+    await send_photo(
+        update,
+        photo=photo_data,
+        caption=f"Estrutura de diretórios: {os.path.basename(current_abs_dir) or response.get('repo_name', '')}",
+    )
 
 
-async def view_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+@rpc_handler("capturar conteúdo do arquivo")
+@require_repo
+async def view_command(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, response: dict
+) -> None:
     """Captura e envia uma imagem do conteúdo de um arquivo."""
-    try:
-        user_id = str(update.effective_user.id)
-
-        # Verifica se um repositório foi selecionado
-        response = mcp_client.get_current_directory(user_id)
-
-        if "error" in response or response.get("status") != "success":
-            await update.message.reply_text(
-                "Nenhum repositório selecionado. Use /repos para listar e /select para escolher um."
-            )
-            return
-
-        if not context.args:
-            await update.message.reply_text(
-                "Por favor, especifique o arquivo.\nUso: /view <arquivo>"
-            )
-            return
-
-        file_arg = " ".join(context.args)
-        repo_path = response.get("repo_path", "")
-        current_path = response.get("current_path", "")
+    if not context.args:
+        await send_text(
+            update, "Por favor, especifique o arquivo.\nUso: /view <arquivo>"
+        )
+        return
 
-        # Constrói o caminho do arquivo
-        file_rel_path = os.path.normpath(os.path.join(current_path, file_arg))
-        file_abs_path = os.path.join(repo_path, file_rel_path)
+    file_arg = " ".join(context.args)
+    repo_path = response.get("repo_path", "")
+    current_path = response.get("current_path", "")
 
-        # Verifica se o arquivo existe
-        if not os.path.isfile(file_abs_path):
-            await update.message.reply_text(f"Arquivo não encontrado: {file_rel_path}")
-            return
+    # Resolve o caminho e verifica existência/tamanho em um único stat
+    file_rel_path, file_abs_path, is_file, file_size = await asyncio.to_thread(
+        _probe_file, repo_path, current_path, file_arg
+    )
 
-        # Verifica o tamanho do arquivo
-        file_size = os.path.getsize(file_abs_path)
-        if file_size > 1000000:  # 1MB
-            await update.message.reply_text(
-                f"O arquivo é muito grande ({file_size / 1000000:.2f} MB). "
-                f"Posso mostrar apenas arquivos menores que 1 MB."
-            )
-            return
+    if not is_file:
+        await send_text(update, f"Arquivo não encontrado: {file_rel_path}")
+        return
 
-        # Informa ao usuário que a captura está sendo gerada
-        await update.message.reply_text(
-            "Gerando captura do conteúdo do arquivo. Aguarde um momento..."
+    # Verifica o tamanho do arquivo
+    if file_size > 1000000:  # 1MB
+        await send_text(
+            update,
+            f"O arquivo é muito grande ({file_size / 1000000:.2f} MB). "
+            f"Posso mostrar apenas arquivos menores que 1 MB.",
         )
+        return
+
+    # Avisa o usuário enquanto a captura é renderizada fora do event loop;
+    # a fila FIFO por chat garante que o aviso chega antes da foto
+    _, screenshot_path = await asyncio.gather(
+        send_text(
+            update, "Gerando captura do conteúdo do arquivo. Aguarde um momento..."
+        ),
+        asyncio.to_thread(capture_file_content, file_abs_path),
+    )
 
-        # Gera a captura
-        screenshot_path = capture_file_content(file_abs_path)
+    if screenshot_path:
+        try:
+            # Lê a imagem sem bloquear o event loop e envia pelo Telegram
+            async with aiofiles.open(screenshot_path, "rb") as f:
+                photo_data = await f.read()
 
-        if screenshot_path:
-            # Envia a imagem pelo Telegram
-            await update.message.reply_photo(
-                photo=open(screenshot_path, "rb"),
+            await send_photo(
+                update,
+                photo=photo_data,
                 caption=f"Conteúdo do arquivo: {file_rel_path}",
             )
-
-            # Remove o arquivo temporário
-            os.unlink(screenshot_path)
-        else:
-            await update.message.reply_text(
-                "Não foi possível gerar a captura do conteúdo do arquivo."
-            )
-
-    except Exception as e:
-        await update.message.reply_text(
-            f"Erro ao capturar conteúdo do arquivo: {str(e)}"
+        finally:
+            # Remove o arquivo temporário mesmo em caso de erro no envio
+            if os.path.exists(screenshot_path):
+                await asyncio.to_thread(os.unlink, screenshot_path)
+    else:
+        await send_text(
+            update, "Não foi possível gerar a captura do conteúdo do arquivo."
         )
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Processa mensagens que não são comandos."""
-    await update.message.reply_text(
+    await send_text(
+        update,
         "Por favor, use comandos específicos para interagir comigo. "
-        "Use /help para ver a lista de comandos disponíveis."
+        "Use /help para ver a lista de comandos disponíveis.",
     )
 
 
+# Tabela de comandos registrados no bot (nome, callback)
+COMMANDS = [
+    # Navegação
+    ("start", start),
+    ("help", help_command),
+    ("repos", repos_command),
+    ("select", select_command),
+    ("ls", ls_command),
+    ("cd", cd_command),
+    ("pwd", pwd_command),
+    ("tree", tree_command),
+    ("cat", cat_command),
+    # Git
+    ("status", status_command),
+    ("branch", branch_command),
+    ("checkout", checkout_command),
+    ("suggest", suggest_command),
+    ("apply", apply_command),
+    ("reject", reject_command),
+    ("commit", commit_command),
+    ("push", push_command),
+]
+
+
+async def _warm_up(application: Application) -> None:
+    """Abre conexões com a API do Telegram antes do primeiro update.
+
+    Os sockets já ficam estabelecidos no pool, eliminando o custo do
+    handshake TLS na primeira resposta de cada conexão.
+    """
+    await asyncio.gather(*(application.bot.get_me() for _ in range(4)))
+
+
 def main() -> None:
     """Inicia o bot."""
-    # Cria o aplicativo e passa o token do bot
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
-
-    # Adiciona handlers de navegação
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("repos", repos_command))
-    application.add_handler(CommandHandler("select", select_command))
-    application.add_handler(CommandHandler("ls", ls_command))
-    application.add_handler(CommandHandler("cd", cd_command))
-    application.add_handler(CommandHandler("pwd", pwd_command))
-    application.add_handler(CommandHandler("tree", tree_command))
-    application.add_handler(CommandHandler("cat", cat_command))
-
-    # Adiciona handlers de Git
-    application.add_handler(CommandHandler("status", status_command))
-    application.add_handler(CommandHandler("branch", branch_command))
-    application.add_handler(CommandHandler("checkout", checkout_command))
-    application.add_handler(CommandHandler("suggest", suggest_command))
-    application.add_handler(CommandHandler("apply", apply_command))
-    application.add_handler(CommandHandler("reject", reject_command))
-    application.add_handler(CommandHandler("commit", commit_command))
-    application.add_handler(CommandHandler("push", push_command))
+    # Cria o aplicativo com um pool de conexões ampliado: o padrão é pequeno
+    # e estoura ("connection pool is full") sob rajadas de respostas
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .connection_pool_size(256)
+        .pool_timeout(30)
+        .get_updates_connection_pool_size(1)
+        .connect_timeout(10)
+        .read_timeout(30)
+        .rate_limiter(
+            # Modela os limites da API do Telegram (30 msg/s globais e os
+            # limites por chat) direto na camada de envio do PTB
+            AIORateLimiter(overall_max_rate=30, overall_time_period=1, max_retries=3)
+        )
+        .concurrent_updates(True)
+        .post_init(_warm_up)
+        .build()
+    )
+
+    # Registra os comandos a partir da tabela em uma única chamada ao
+    # dispatcher; block=False permite que handlers lentos (ex.: /suggest
+    # aguardando o Claude) rodem em paralelo
+    application.add_handlers(
+        [CommandHandler(name, callback, block=False) for name, callback in COMMANDS]
+    )
 
     # Adiciona handler para mensagens não relacionadas a comandos
     application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
+        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message, block=False)
     )
 
-    # Inicia o bot
-    application.run_polling()
+    # Inicia o bot: webhook por padrão (o Telegram empurra as atualizações,
+    # sem o custo e a latência do polling de getUpdates); polling como fallback
+    public_host = get_env_var("PUBLIC_HOST")
+
+    if os.getenv("USE_POLLING") or not public_host:
+        if not public_host:
+            logger.warning(
+                "PUBLIC_HOST não definido; iniciando em modo polling. "
+                "Configure PUBLIC_HOST para usar webhooks."
+            )
+        application.run_polling()
+    else:
+        webhook_port = int(get_env_var("WEBHOOK_PORT", "8443"))
+
+        # Sem segredo o Telegram aceitaria POSTs de qualquer origem no
+        # webhook; gera e persiste um, como feito com a MCP_API_KEY
+        webhook_secret = get_env_var("WEBHOOK_SECRET")
+        if not webhook_secret:
+            import secrets
+
+            webhook_secret = secrets.token_urlsafe(32)
+            update_env_var("WEBHOOK_SECRET", webhook_secret)
+            logger.info("Novo WEBHOOK_SECRET gerado e salvo no arquivo .env")
+
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=webhook_port,
+            url_path=TELEGRAM_TOKEN,
+            webhook_url=f"https://{public_host}/{TELEGRAM_TOKEN}",
+            # O Telegram ecoa o segredo em cada POST; requisições sem ele
+            # são descartadas antes de chegar aos handlers
+            secret_token=webhook_secret,
+        )
 
 
 if __name__ == "__main__":
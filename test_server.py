@@ -3,13 +3,18 @@
 Script para testar a conectividade com o servidor MCP.
 """
 
-import hashlib
 import hmac
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback para o json da stdlib
+    orjson = None
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente
@@ -22,13 +27,39 @@ MCP_API_KEY = os.getenv("MCP_API_KEY", "")
 
 BASE_URL = f"http://{MCP_HOST}:{MCP_PORT}"
 
+# Sessão única para todos os testes: o socket é reaproveitado via
+# keep-alive em vez de um handshake TCP por chamada; sem retries ocultos
+SESSION = requests.Session()
+SESSION.mount(
+    "http://",
+    requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0),
+)
+SESSION.headers.update({"Content-Type": "application/json"})
+
+# Modelo de cabeçalhos de autenticação: só timestamp e assinatura mudam
+# por chamada; os campos fixos não são realocados a cada requisição
+_AUTH_HEADERS_TEMPLATE = {
+    "X-API-Key": MCP_API_KEY,
+    "Content-Type": "application/json",
+    "X-Timestamp": "",
+    "X-Signature": "",
+}
+
+
+def _auth_headers(timestamp: str, signature: str) -> dict:
+    """Monta os cabeçalhos autenticados a partir do modelo compartilhado."""
+    headers = _AUTH_HEADERS_TEMPLATE.copy()
+    headers["X-Timestamp"] = timestamp
+    headers["X-Signature"] = signature
+    return headers
+
 
 def test_health():
     """Teste o endpoint de verificação de saúde (não requer autenticação)."""
     url = f"{BASE_URL}/health"
 
     try:
-        response = requests.get(url)
+        response = SESSION.get(url)
         print(f"Health Check Status: {response.status_code}")
         print(f"Response: {response.json()}")
         return response.status_code == 200
@@ -42,7 +73,7 @@ def test_root():
     url = f"{BASE_URL}/"
 
     try:
-        response = requests.get(url)
+        response = SESSION.get(url)
         print(f"Root Endpoint Status: {response.status_code}")
         print(f"Response: {response.json()}")
         return response.status_code == 200
@@ -51,11 +82,42 @@ def test_root():
         return False
 
 
-def generate_signature(data, timestamp, api_key):
-    """Gera uma assinatura HMAC para a requisição."""
-    message = f"{json.dumps(data)}{timestamp}"
-    signature = hmac.new(api_key.encode(), message.encode(), hashlib.sha256).hexdigest()
-    return signature
+def canonical_json(data) -> bytes:
+    """Serializa os dados em JSON canônico, já em bytes.
+
+    Chaves ordenadas e sem espaços: a mesma entrada produz sempre os
+    mesmos bytes, que servem tanto para o corpo da requisição quanto
+    para a assinatura, sem uma segunda serialização. Com orjson a saída
+    já nasce em bytes, sem a passagem str -> bytes da stdlib.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+
+def generate_signature(body: bytes, timestamp: str, api_key: str) -> str:
+    """Gera uma assinatura HMAC sobre o corpo canônico e o timestamp.
+
+    hmac.digest é o caminho rápido em C para mensagens pequenas: dispensa
+    a construção do objeto HMAC e a alimentação incremental de hmac.new.
+    """
+    return hmac.digest(api_key.encode(), body + timestamp.encode(), "sha256").hex()
+
+
+def verify_signature(body: bytes, timestamp: str, api_key: str, provided_hex: str):
+    """Verifica uma assinatura HMAC em tempo constante.
+
+    Compara os bytes crus do digest com hmac.compare_digest: sem o
+    curto-circuito do '==' de strings, o tempo de resposta não revela em
+    que ponto a assinatura diverge. Qualquer verificação no lado do
+    servidor deve usar esta mesma primitiva.
+    """
+    expected = hmac.digest(api_key.encode(), body + timestamp.encode(), "sha256")
+    try:
+        provided = bytes.fromhex(provided_hex)
+    except ValueError:
+        return False
+    return hmac.compare_digest(expected, provided)
 
 
 def test_authenticated_get():
@@ -69,21 +131,14 @@ def test_authenticated_get():
     # Dados para requisição
     data = {"chat_id": "123456789"}
 
-    # Gera a assinatura
+    # Gera a assinatura sobre o corpo canônico (serializado uma única vez)
     timestamp = str(int(time.time()))
     data["timestamp"] = timestamp  # Inclui o timestamp nos dados para verificação
-    signature = generate_signature(data, timestamp, MCP_API_KEY)
-
-    # Headers com autenticação
-    headers = {
-        "X-API-Key": MCP_API_KEY,
-        "X-Timestamp": timestamp,
-        "X-Signature": signature,
-        "Content-Type": "application/json",
-    }
+    signature = generate_signature(canonical_json(data), timestamp, MCP_API_KEY)
+    headers = _auth_headers(timestamp, signature)
 
     try:
-        response = requests.get(url, headers=headers, params=data)
+        response = SESSION.get(url, headers=headers, params=data)
         print(f"Authenticated GET Status: {response.status_code}")
         print(f"Response: {response.text}")
         return response.status_code == 200
@@ -103,20 +158,14 @@ def test_authenticated_post():
     # Dados para requisição
     data = {"chat_id": "123456789", "repo_name": "test-repo"}
 
-    # Gera a assinatura
+    # Serializa o corpo uma única vez; os mesmos bytes assinam e viajam
     timestamp = str(int(time.time()))
-    signature = generate_signature(data, timestamp, MCP_API_KEY)
-
-    # Headers com autenticação
-    headers = {
-        "X-API-Key": MCP_API_KEY,
-        "X-Timestamp": timestamp,
-        "X-Signature": signature,
-        "Content-Type": "application/json",
-    }
+    body = canonical_json(data)
+    signature = generate_signature(body, timestamp, MCP_API_KEY)
+    headers = _auth_headers(timestamp, signature)
 
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = SESSION.post(url, headers=headers, data=body)
         print(f"Authenticated POST Status: {response.status_code}")
         print(f"Response: {response.text}")
         return response.status_code in [
@@ -129,33 +178,37 @@ def test_authenticated_post():
 
 
 def main():
-    """Função principal para executar os testes."""
-    print("Testando conexão com o servidor MCP...\n")
+    """Função principal para executar os testes.
 
-    # Testa o endpoint de saúde
-    print("1. Testando endpoint de saúde...")
-    health_ok = test_health()
-    print(f"Resultado: {'OK' if health_ok else 'FALHA'}\n")
+    As quatro verificações são independentes e limitadas por rede; rodam
+    em paralelo, e o tempo total cai da soma das latências para a maior.
+    """
+    print("Testando conexão com o servidor MCP...\n")
 
-    # Testa o endpoint raiz
-    print("2. Testando endpoint raiz...")
-    root_ok = test_root()
-    print(f"Resultado: {'OK' if root_ok else 'FALHA'}\n")
+    checks = [
+        ("endpoint de saúde", test_health),
+        ("endpoint raiz", test_root),
+        ("endpoint GET autenticado", test_authenticated_get),
+        ("endpoint POST autenticado", test_authenticated_post),
+    ]
 
-    # Testa um endpoint GET autenticado
-    print("3. Testando endpoint GET autenticado...")
-    auth_get_ok = test_authenticated_get()
-    print(f"Resultado: {'OK' if auth_get_ok else 'FALHA'}\n")
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [(name, executor.submit(fn)) for name, fn in checks]
+        results = {name: future.result() for name, future in futures}
 
-    # Testa um endpoint POST autenticado
-    print("4. Testando endpoint POST autenticado...")
-    auth_post_ok = test_authenticated_post()
-    print(f"Resultado: {'OK' if auth_post_ok else 'FALHA'}\n")
+    for i, (name, _) in enumerate(checks, start=1):
+        print(f"{i}. {name}: {'OK' if results[name] else 'FALHA'}")
 
     # Resultado geral
-    overall = health_ok and root_ok and (auth_get_ok or auth_post_ok)
+    overall = (
+        results["endpoint de saúde"]
+        and results["endpoint raiz"]
+        and (
+            results["endpoint GET autenticado"] or results["endpoint POST autenticado"]
+        )
+    )
     print(
-        f"Resultado geral: {'TODOS OS TESTES PASSARAM' if overall else 'ALGUNS TESTES FALHARAM'}"
+        f"\nResultado geral: {'TODOS OS TESTES PASSARAM' if overall else 'ALGUNS TESTES FALHARAM'}"
     )
 
 
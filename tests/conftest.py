@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Garante que a raiz do projeto esteja no path uma única vez, antes da
+# coleta dos módulos de teste; evita inserções duplicadas por arquivo
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
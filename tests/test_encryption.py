@@ -1,14 +1,10 @@
 import base64
 import os
-import sys
 import tempfile
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-# Adiciona o diretório raiz ao path para importação
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-
 # Importa o módulo para teste - com mock para evitar dependência de ambiente
 with patch.dict(
     os.environ, {"ENCRYPTION_KEY": base64.urlsafe_b64encode(b"A" * 32).decode()}
@@ -17,7 +13,7 @@ with patch.dict(
 
 
 class TestEncryptionManager:
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def encryption_manager(self):
         with patch.dict(
             os.environ, {"ENCRYPTION_KEY": base64.urlsafe_b64encode(b"A" * 32).decode()}
@@ -1,28 +1,95 @@
+import functools
 import logging
 import os
+import re
+from types import MappingProxyType
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
+# Cache do arquivo .env, chaveado por (mtime_ns, tamanho): o arquivo é lido
+# e parseado uma única vez; qualquer escrita em disco troca a chave e o
+# cache é reconstruído na leitura seguinte
+# "entries" mapeia nome -> (índice da linha, valor): um único dicionário
+# serve tanto ao lookup O(1) de get_env_var quanto ao update in-place
+_ENV_CACHE: Dict[str, Any] = {"stat": None, "lines": [], "entries": {}}
+
+
+# Uma linha válida do .env em uma única passada do motor de regex (em C),
+# no lugar das várias chamadas strip/startswith/split por linha
+_ENV_RE = re.compile(r"^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*(.*?)[ \t\r\n]*$")
+
+
+def _unquote(value: str) -> str:
+    """Remove um par de aspas envolvente, se presente."""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+        return value[1:-1]
+    return value
+
+
+def invalidate_env_cache() -> None:
+    """Descarta o cache do .env; a próxima leitura recarrega do disco."""
+    _ENV_CACHE["stat"] = None
+    _ENV_CACHE["lines"] = []
+    _ENV_CACHE["entries"] = {}
+
+
+def _refresh_env_cache() -> None:
+    """Recarrega o cache se o .env mudou desde a última leitura."""
+    try:
+        st = os.stat(".env")
+    except FileNotFoundError:
+        logger.warning("Arquivo .env não encontrado.")
+        invalidate_env_cache()
+        return
+    except OSError as e:
+        logger.error("Erro ao ler arquivo .env: %s", e)
+        invalidate_env_cache()
+        return
+
+    key = (st.st_mtime_ns, st.st_size)
+    if _ENV_CACHE["stat"] == key:
+        return
+
+    try:
+        # read() + splitlines: um único buffer contíguo em vez do buffer
+        # crescível por linha de readlines()
+        with open(".env", "r", encoding="utf-8") as f:
+            lines = f.read().splitlines(keepends=True)
+    except FileNotFoundError:
+        # O arquivo sumiu entre o stat e o open (janela de corrida)
+        logger.warning("Arquivo .env não encontrado.")
+        invalidate_env_cache()
+        return
+    except OSError as e:
+        logger.error("Erro ao ler arquivo .env: %s", e)
+        invalidate_env_cache()
+        return
+
+    entries = {}
+    for i, raw_line in enumerate(lines):
+        match = _ENV_RE.match(raw_line)
+        if match is None:
+            continue
+        entries[match.group(1)] = (i, _unquote(match.group(2)))
+
+    _ENV_CACHE["stat"] = key
+    _ENV_CACHE["lines"] = lines
+    _ENV_CACHE["entries"] = entries
+
 
 def read_env_file() -> List[str]:
     """
     Lê o conteúdo do arquivo .env e retorna como uma lista de linhas.
 
+    A leitura vem do cache em memória, revalidado pelo mtime/tamanho do
+    arquivo; o disco só é tocado quando o .env realmente muda.
+
     Returns:
         List[str]: Lista contendo cada linha do arquivo .env
     """
-    env_content = []
-    try:
-        if os.path.exists(".env"):
-            with open(".env", "r", encoding="utf-8") as f:
-                env_content = f.readlines()
-        else:
-            logger.warning("Arquivo .env não encontrado.")
-    except Exception as e:
-        logger.error(f"Erro ao ler arquivo .env: {str(e)}")
-
-    return env_content
+    _refresh_env_cache()
+    return list(_ENV_CACHE["lines"])
 
 
 def write_env_file(env_content: List[str]) -> bool:
@@ -35,12 +102,22 @@ def write_env_file(env_content: List[str]) -> bool:
     Returns:
         bool: True se a operação foi bem-sucedida, False caso contrário
     """
+    # Escreve em um temporário e renomeia por cima: o .env nunca fica
+    # truncado no disco se o processo cair no meio da escrita
+    tmp_path = f".env.{os.getpid()}.tmp"
     try:
-        with open(".env", "w", encoding="utf-8") as f:
+        with open(tmp_path, "w", encoding="utf-8") as f:
             f.writelines(env_content)
+        os.replace(tmp_path, ".env")
+        invalidate_env_cache()
+        invalidate_config_cache()
         return True
-    except Exception as e:
-        logger.error(f"Erro ao escrever arquivo .env: {str(e)}")
+    except OSError as e:
+        logger.error("Erro ao escrever arquivo .env: %s", e)
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
         return False
 
 
@@ -60,18 +137,12 @@ def get_env_var(var_name: str, default: Optional[str] = None) -> Optional[str]:
     # Primeiro tenta obter do ambiente
     value = os.getenv(var_name)
 
-    # Se não encontrou, procura no arquivo .env
+    # Se não encontrou, consulta o dicionário já parseado do .env (O(1))
     if value is None:
-        env_content = read_env_file()
-        for line in env_content:
-            if line.strip().startswith(f"{var_name}="):
-                value = line.strip().split("=", 1)[1].strip()
-                # Remove aspas, se presentes
-                if (value.startswith('"') and value.endswith('"')) or (
-                    value.startswith("'") and value.endswith("'")
-                ):
-                    value = value[1:-1]
-                break
+        _refresh_env_cache()
+        entry = _ENV_CACHE["entries"].get(var_name)
+        if entry is not None:
+            value = entry[1]
 
     # Se ainda não encontrou, retorna o valor padrão
     return value if value is not None else default
@@ -90,24 +161,24 @@ def update_env_var(var_name: str, value: str) -> bool:
     """
     try:
         env_content = read_env_file()
-
-        # Procura a linha com a variável
-        var_line_found = False
-        for i, line in enumerate(env_content):
-            if line.strip().startswith(f"{var_name}="):
-                env_content[i] = f"{var_name}={value}\n"
-                var_line_found = True
-                break
-
-        # Se não encontrou, adiciona no final
-        if not var_line_found:
-            env_content.append(f"{var_name}={value}\n")
+        new_line = f"{var_name}={value}\n"
+
+        # Localiza a linha pelo índice já construído no cache (O(1))
+        entry = _ENV_CACHE["entries"].get(var_name)
+        idx = entry[0] if entry is not None else None
+        if idx is not None:
+            # Valor inalterado: nada a reescrever
+            if env_content[idx] == new_line:
+                return True
+            env_content[idx] = new_line
+        else:
+            env_content.append(new_line)
 
         # Escreve de volta no arquivo
         return write_env_file(env_content)
 
-    except Exception as e:
-        logger.error(f"Erro ao atualizar variável no arquivo .env: {str(e)}")
+    except OSError as e:
+        logger.error("Erro ao atualizar variável no arquivo .env: %s", e)
         return False
 
 
@@ -118,75 +189,100 @@ def load_all_env_vars() -> Dict[str, str]:
     Returns:
         Dict[str, str]: Dicionário com todas as variáveis do arquivo .env
     """
-    env_vars = {}
-    env_content = read_env_file()
-
-    for line in env_content:
-        line = line.strip()
-        if line and not line.startswith("#"):
-            try:
-                key, value = line.split("=", 1)
-                key = key.strip()
-                value = value.strip()
+    _refresh_env_cache()
+    return {name: value for name, (_, value) in _ENV_CACHE["entries"].items()}
 
-                # Remove aspas, se presentes
-                if (value.startswith('"') and value.endswith('"')) or (
-                    value.startswith("'") and value.endswith("'")
-                ):
-                    value = value[1:-1]
 
-                env_vars[key] = value
-            except ValueError:
-                # Ignora linhas que não têm o formato key=value
-                continue
-
-    return env_vars
+def _resolve(all_vars: Dict[str, str], name: str, default: Any = None) -> Any:
+    """Resolve uma variável: ambiente primeiro, depois o .env já parseado."""
+    value = os.environ.get(name)
+    if value is None:
+        value = all_vars.get(name, default)
+    return value
 
 
+@functools.lru_cache(maxsize=1)
 def get_connection_config() -> Dict[str, Any]:
     """
     Obtém configurações de conexão comuns para os componentes do sistema.
 
+    O resultado é cacheado: a configuração é lida uma única vez por processo.
+    Use get_connection_config.cache_clear() após alterar o arquivo .env.
+
     Returns:
         Dict[str, Any]: Dicionário com as configurações de conexão
     """
-    return {
-        "telegram_token": get_env_var("TELEGRAM_TOKEN"),
-        "claude_api_key": get_env_var("CLAUDE_API_KEY"),
-        "github_token": get_env_var("GITHUB_TOKEN"),
-        "repos_base_path": get_env_var("REPOS_BASE_PATH"),
-        "mcp_host": get_env_var("MCP_HOST", "localhost"),
-        "mcp_port": get_env_var("MCP_PORT", "8000"),
-        "mcp_api_key": get_env_var("MCP_API_KEY"),
-        "encryption_key": get_env_var("ENCRYPTION_KEY"),
-    }
-
-
+    env = load_all_env_vars()
+    return MappingProxyType(
+        {
+            "telegram_token": _resolve(env, "TELEGRAM_TOKEN"),
+            "claude_api_key": _resolve(env, "CLAUDE_API_KEY"),
+            "github_token": _resolve(env, "GITHUB_TOKEN"),
+            "repos_base_path": _resolve(env, "REPOS_BASE_PATH"),
+            "mcp_host": _resolve(env, "MCP_HOST", "localhost"),
+            "mcp_port": _resolve(env, "MCP_PORT", "8000"),
+            "mcp_api_key": _resolve(env, "MCP_API_KEY"),
+            "encryption_key": _resolve(env, "ENCRYPTION_KEY"),
+        }
+    )
+
+
+@functools.lru_cache(maxsize=1)
 def get_repo_info() -> Dict[str, Any]:
     """
     Obtém informações relacionadas aos repositórios e configurações Git.
 
+    O resultado é cacheado: a configuração é lida uma única vez por processo.
+    Use get_repo_info.cache_clear() após alterar o arquivo .env.
+
     Returns:
         Dict[str, Any]: Dicionário com informações dos repositórios
     """
-    return {
-        "repos_base_path": get_env_var("REPOS_BASE_PATH"),
-        "github_token": get_env_var("GITHUB_TOKEN"),
-        "github_username": get_env_var("GITHUB_USERNAME"),
-        "github_email": get_env_var("GITHUB_EMAIL", "bot@example.com"),
-    }
-
-
+    env = load_all_env_vars()
+    return MappingProxyType(
+        {
+            "repos_base_path": _resolve(env, "REPOS_BASE_PATH"),
+            "github_token": _resolve(env, "GITHUB_TOKEN"),
+            "github_username": _resolve(env, "GITHUB_USERNAME"),
+            "github_email": _resolve(env, "GITHUB_EMAIL", "bot@example.com"),
+        }
+    )
+
+
+@functools.lru_cache(maxsize=1)
 def get_security_config() -> Dict[str, Any]:
     """
     Obtém configurações relacionadas à segurança.
 
+    O resultado é cacheado: a configuração é lida uma única vez por processo.
+    Use get_security_config.cache_clear() após alterar o arquivo .env.
+
     Returns:
         Dict[str, Any]: Dicionário com configurações de segurança
     """
-    return {
-        "encryption_key": get_env_var("ENCRYPTION_KEY"),
-        "mcp_api_key": get_env_var("MCP_API_KEY"),
-        "authorized_users": get_env_var("AUTHORIZED_USERS", "").split(","),
-        "admin_users": get_env_var("ADMIN_USER", "").split(","),
-    }
+    env = load_all_env_vars()
+    return MappingProxyType(
+        {
+            "encryption_key": _resolve(env, "ENCRYPTION_KEY"),
+            "mcp_api_key": _resolve(env, "MCP_API_KEY"),
+            # frozenset: pertencimento O(1) nas checagens por requisição, com
+            # espaços aparados e entradas vazias (vírgula final) descartadas
+            "authorized_users": frozenset(
+                u.strip()
+                for u in _resolve(env, "AUTHORIZED_USERS", "").split(",")
+                if u.strip()
+            ),
+            "admin_users": frozenset(
+                u.strip()
+                for u in _resolve(env, "ADMIN_USER", "").split(",")
+                if u.strip()
+            ),
+        }
+    )
+
+
+def invalidate_config_cache() -> None:
+    """Limpa os caches dos helpers de configuração após mudança no .env."""
+    get_connection_config.cache_clear()
+    get_repo_info.cache_clear()
+    get_security_config.cache_clear()
@@ -0,0 +1,58 @@
+import json
+import sqlite3
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteSessionStore:
+    """Armazena sessões de usuário em SQLite, compartilhado entre processos.
+
+    Com múltiplos workers do uvicorn, um dicionário em memória deixaria cada
+    processo com sua própria visão do repositório selecionado. O SQLite em
+    modo WAL oferece leituras concorrentes baratas e escrita atômica por
+    chave, sem exigir um serviço externo como Redis.
+    """
+
+    def __init__(self, db_path: str):
+        self._db_path = db_path
+        # Uma conexão por thread: sqlite3 não permite compartilhar conexões
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(chat_id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, chat_id: str):
+        """Obtém os dados da sessão como dicionário, ou None se não existir."""
+        row = (
+            self._conn()
+            .execute("SELECT data FROM sessions WHERE chat_id = ?", (chat_id,))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def set(self, chat_id: str, data: dict) -> None:
+        """Grava (ou substitui) os dados da sessão de forma atômica."""
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (chat_id, data) VALUES (?, ?)",
+                (chat_id, json.dumps(data)),
+            )
+
+    def delete(self, chat_id: str) -> None:
+        """Remove a sessão do usuário, se existir."""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM sessions WHERE chat_id = ?", (chat_id,))
@@ -1,29 +1,339 @@
+import asyncio
+import functools
+import io
+import json
 import logging
+from dataclasses import dataclass
+import operator
 import os
+import stat
 import subprocess
+import threading
 from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
 
+import pygit2
+import requests
 from git import Repo
+from pygit2.enums import BranchType, FileStatus
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Configuração de logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+from utils.session_store import SQLiteSessionStore
+
+# A configuração do logging (basicConfig) fica nos pontos de entrada;
+# módulos de biblioteca só obtêm o próprio logger
 logger = logging.getLogger(__name__)
 
+# Sessão HTTP compartilhada para a API do GitHub: reaproveita conexões
+# TLS entre disparos (evita o handshake completo por requisição) e aplica
+# backoff automático respeitando o Retry-After em caso de rate limit
+_GITHUB_SESSION = requests.Session()
+_GITHUB_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=1.0,
+            status_forcelist=[429, 502, 503, 504],
+            respect_retry_after_header=True,
+        ),
+    ),
+)
+
+
+@dataclass(slots=True)
+class UserSession:
+    """Sessão de navegação de um usuário em um repositório.
+
+    Slots no lugar do dicionário por usuário: acesso a atributo direto,
+    sem hashing de chave, e menos memória por sessão.
+    """
+
+    repo_name: str
+    repo_path: str
+    current_dir: str = ""  # Caminho relativo dentro do repo; vazio = raiz
+
+
+class SessionMap:
+    """Interface de dicionário sobre o SQLiteSessionStore, em UserSession.
+
+    Mantém a ergonomia de dict usada pelo restante do código enquanto as
+    sessões ficam no SQLite, visíveis para todos os workers do servidor.
+    Mutações em uma sessão devem ser gravadas de volta com atribuição
+    (store[chat_id] = session) para persistirem.
+    """
+
+    def __init__(self, store: SQLiteSessionStore):
+        self._store = store
+
+    def get(self, chat_id: str):
+        data = self._store.get(chat_id)
+        return UserSession(**data) if data else None
+
+    def __contains__(self, chat_id: str) -> bool:
+        return self._store.get(chat_id) is not None
+
+    def __getitem__(self, chat_id: str) -> UserSession:
+        data = self._store.get(chat_id)
+        if data is None:
+            raise KeyError(chat_id)
+        return UserSession(**data)
+
+    def __setitem__(self, chat_id: str, session: UserSession) -> None:
+        self._store.set(
+            chat_id,
+            {
+                "repo_name": session.repo_name,
+                "repo_path": session.repo_path,
+                "current_dir": session.current_dir,
+            },
+        )
+
+
+@functools.lru_cache(maxsize=64)
+def _get_repo(repo_path: str) -> Repo:
+    """Memoiza objetos Repo por caminho.
+
+    A construção do GitPython revalida o diretório .git a cada chamada;
+    reutilizar a instância elimina esse custo nos comandos Git repetidos.
+    """
+    return Repo(repo_path)
+
+
+@functools.lru_cache(maxsize=64)
+def _get_pygit2_repo(repo_path: str) -> pygit2.Repository:
+    """Memoiza repositórios pygit2 por caminho.
+
+    As operações Git correntes (status, branches, checkout, commit, push)
+    rodam em processo via libgit2, sem o fork de um subprocesso git por
+    comando que o GitPython faz.
+    """
+    return pygit2.Repository(repo_path)
+
+
+# Rótulos legíveis para os flags de status do libgit2
+_STATUS_LABELS = (
+    (FileStatus.INDEX_NEW | FileStatus.WT_NEW, "novo"),
+    (FileStatus.INDEX_MODIFIED | FileStatus.WT_MODIFIED, "modificado"),
+    (FileStatus.INDEX_DELETED | FileStatus.WT_DELETED, "removido"),
+    (FileStatus.INDEX_RENAMED | FileStatus.WT_RENAMED, "renomeado"),
+)
+
+
+def _format_status(repo: pygit2.Repository) -> str:
+    """Formata o status do repositório em texto no estilo do git status."""
+    if repo.head_is_unborn:
+        header = "Branch atual: (sem commits)"
+    else:
+        header = f"Branch atual: {repo.head.shorthand}"
+
+    lines = [header]
+    entries = repo.status()
+    changed = False
+    for path, flags in sorted(entries.items()):
+        if flags & FileStatus.IGNORED:
+            continue
+        labels = [label for mask, label in _STATUS_LABELS if flags & mask]
+        lines.append(f"{', '.join(labels) or 'alterado'}: {path}")
+        changed = True
+
+    if not changed:
+        lines.append("Árvore de trabalho limpa; nada a commitar.")
+    return "\n".join(lines)
+
+
+# Orçamento da varredura da árvore: o bot envia saídas longas como
+# anexo (tree.txt), então o corte serve só para limitar o passeio em
+# diretórios gigantes, não para caber em uma mensagem do Telegram
+_TREE_WALK_LIMIT = 100_000
+
+# Arquivos maiores que isso (256 KB) não entram no cache de leitura
+_FILE_CACHE_MAX_SIZE = 262144
+
+
+def _read_text_file(path: str, size: int) -> str:
+    """Lê um arquivo texto em binário com um decode único.
+
+    Os primeiros 4 KB são sondados por bytes NUL: um arquivo binário é
+    rejeitado com ValueError antes de ler (e decodificar com replace) o
+    restante — perto do teto de 1 MB isso poupa memória e CPU à toa.
+    """
+    with open(path, "rb") as file:
+        head = file.read(4096)
+        if b"\x00" in head:
+            raise ValueError("Arquivo binário não suportado.")
+        rest = file.read(size - len(head)) if size > len(head) else b""
+    return (head + rest).decode("utf-8", "replace")
+
+
+@functools.lru_cache(maxsize=256)
+def _read_file_cached(path: str, mtime_ns: int, size: int) -> str:
+    """Lê um arquivo para o cache de conteúdo.
+
+    A chave inclui mtime e tamanho: qualquer alteração em disco muda a
+    chave e o cache é invalidado sozinho; arquivos quentes (o usuário
+    repetindo /cat enquanto itera) são servidos da RAM. Binários não são
+    cacheados: o ValueError da sondagem propaga sem entrar no cache.
+    """
+    return _read_text_file(path, size)
+
+
+@functools.lru_cache(maxsize=8)
+def _scan_repos(base_path: str, mtime_ns: int) -> tuple:
+    """Varre o caminho base procurando repositórios Git.
+
+    Memoizado por mtime do diretório base: só revarre (listdir + dois
+    stats por entrada) quando um repositório é criado ou removido.
+    """
+    repos = []
+    with os.scandir(base_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and _is_git_repo(entry.path):
+                repos.append(entry.name)
+    return tuple(sorted(repos))
+
+
+def _is_git_repo(path: str) -> bool:
+    """Verifica se o caminho é um repositório Git com um único stat.
+
+    Um stat de path/.git falha atomicamente se o diretório pai ou o .git
+    não existirem; .git como arquivo regular também conta (worktrees).
+    """
+    try:
+        # Concatenação direta: path nunca tem separador final aqui, e o
+        # helper roda uma vez por entrada na varredura de repositórios
+        st = os.stat(path + os.sep + ".git")
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) or stat.S_ISREG(st.st_mode)
+
+
+@functools.lru_cache(maxsize=64)
+def _real_root(repo_root: str) -> str:
+    """Memoiza o realpath da raiz do repositório.
+
+    A raiz não muda durante a vida do processo; cachear evita refazer a
+    resolução de links simbólicos da raiz a cada navegação.
+    """
+    return os.path.realpath(repo_root)
+
+
+def _safe_resolve(repo_root: str, rel_path: str) -> str:
+    """Resolve rel_path dentro de repo_root, bloqueando escapes do repositório.
+
+    Um único realpath substitui as várias verificações isdir/isfile que os
+    chamadores faziam, e a checagem de prefixo rejeita tentativas de sair
+    do repositório com '..' ou links simbólicos.
+    """
+    root = _real_root(repo_root)
+    resolved = os.path.realpath(os.path.join(root, rel_path))
+    if resolved != root and not resolved.startswith(root + os.sep):
+        raise ValueError(f"Caminho fora do repositório: {rel_path}")
+    return resolved
+
 
 class SystemRepository:
     def __init__(self, base_path: str, github_token: str):
         self.base_path = base_path
         self.github_token = github_token
-        # Armazenamento do repositório atual de cada usuário
-        self.user_current_repos = {}
+        # Sessões de navegação em SQLite, compartilhadas entre os workers
+        self.user_current_repos = SessionMap(
+            SQLiteSessionStore(os.getenv("SESSIONS_DB_PATH", "sessions.db"))
+        )
+        # Cache de metadados de workflows do GitHub, persistido em disco
+        # para sobreviver a reinícios: (owner/repo/workflow) -> (id, etag)
+        self._workflow_cache_path = os.path.join(base_path, ".cache", "github.json")
+        self._workflow_id_cache = self._load_workflow_cache()
+        # Cache de árvores já renderizadas, validado pelo mtime do diretório
+        # raiz da listagem: (repo, dir, profundidade) -> (mtime_ns, saída)
+        self._tree_cache: Dict[tuple, Tuple[int, str]] = {}
+        # Cabeçalhos da API do GitHub montados uma única vez
+        self._github_headers = {
+            "Authorization": f"token {github_token}",
+            "Accept": "application/vnd.github.v3+json",
+        }
+        # URLs de dispatch já montadas: (repo_url, workflow) -> URL final
+        self._dispatch_url_cache: Dict[Tuple[str, str], str] = {}
+        # Locks por repositório: operações que mutam a árvore de trabalho
+        # (checkout, commit, push, pull) serializam dentro do mesmo repo,
+        # mas usuários em repositórios diferentes rodam em paralelo nas
+        # threads do asyncio.to_thread dos endpoints
+        self._repo_locks: Dict[str, threading.Lock] = {}
+
+    def _repo_lock(self, repo_path: str) -> threading.Lock:
+        """Obtém o lock do repositório (setdefault é atômico no CPython)."""
+        return self._repo_locks.setdefault(repo_path, threading.Lock())
+
+    def _invalidate_tree_cache(self, repo_path: str) -> None:
+        """Descarta as árvores cacheadas de um repositório após mutações."""
+        for key in [k for k in self._tree_cache if k[0] == repo_path]:
+            del self._tree_cache[key]
+
+    def _load_workflow_cache(self) -> Dict[str, List[str]]:
+        """Carrega o cache de workflows do disco, se existir."""
+        try:
+            with open(self._workflow_cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError, OSError):
+            return {}
+
+    def _save_workflow_cache(self) -> None:
+        """Persiste o cache de workflows em disco (melhor esforço)."""
+        try:
+            os.makedirs(os.path.dirname(self._workflow_cache_path), exist_ok=True)
+            with open(self._workflow_cache_path, "w", encoding="utf-8") as f:
+                json.dump(self._workflow_id_cache, f)
+        except OSError as e:
+            logger.warning("Não foi possível salvar o cache de workflows: %s", e)
+
+    def _resolve_workflow_id(
+        self, owner: str, repo_name: str, workflow_name: str, headers: Dict[str, str]
+    ) -> Optional[str]:
+        """Resolve o id numérico de um workflow com requisição condicional.
+
+        O GET leva If-None-Match com o ETag cacheado: um 304 confirma o id
+        sem consumir a cota primária de rate limit da API. O resultado fica
+        em memória e em disco, então disparos repetidos do mesmo workflow
+        não pagam a resolução de novo.
+        """
+        key = f"{owner}/{repo_name}/{workflow_name}"
+        cached = self._workflow_id_cache.get(key)
+
+        url = (
+            f"https://api.github.com/repos/{owner}/{repo_name}"
+            f"/actions/workflows/{workflow_name}"
+        )
+        get_headers = dict(headers)
+        if cached:
+            get_headers["If-None-Match"] = cached[1]
+
+        try:
+            response = _GITHUB_SESSION.get(url, headers=get_headers, timeout=10)
+        except Exception as e:
+            logger.warning("Erro ao resolver workflow '%s': %s", workflow_name, e)
+            return cached[0] if cached else None
+
+        if response.status_code == 304 and cached:
+            return cached[0]
+        if response.status_code == 200:
+            workflow_id = str(response.json().get("id", ""))
+            etag = response.headers.get("ETag", "")
+            if workflow_id:
+                self._workflow_id_cache[key] = [workflow_id, etag]
+                self._save_workflow_cache()
+                return workflow_id
+        return cached[0] if cached else None
 
     def get_repo_for_user(
         self, chat_id: str, repo_name: str = None
     ) -> Tuple[Optional[Repo], Optional[str]]:
         """Obtém o repositório atual do usuário."""
-        if chat_id not in self.user_current_repos:
+        # Busca a sessão uma única vez (cada acesso é uma consulta ao SQLite)
+        repo_info = self.user_current_repos.get(chat_id)
+        if repo_info is None:
             return (
                 None,
                 "Nenhum repositório selecionado. Use /repos para listar e /select para escolher um.",
@@ -32,72 +342,130 @@ class SystemRepository:
         if repo_name:
             # Busca o repositório especificado
             repo_path = os.path.join(self.base_path, repo_name)
-            if not os.path.isdir(repo_path) or not os.path.isdir(
-                os.path.join(repo_path, ".git")
-            ):
+            if not _is_git_repo(repo_path):
                 return (
                     None,
                     f"Repositório '{repo_name}' não encontrado ou não é um repositório Git válido.",
                 )
 
-            return Repo(repo_path), None
+            return _get_repo(repo_path), None
         else:
             # Usa o repositório atualmente selecionado
-            repo_info = self.user_current_repos[chat_id]
-            return Repo(repo_info["repo_path"]), None
-
-    async def update_repository(self, repo_instance) -> bool:
-        """Atualiza o repositório local com as alterações remotas."""
+            return _get_repo(repo_info.repo_path), None
+
+    @staticmethod
+    def _git(repo_path: str, *args: str) -> subprocess.CompletedProcess:
+        """Roda um comando git no repositório, capturando a saída."""
+        return subprocess.run(
+            ("git", "-C", repo_path) + args,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+
+    async def update_repository(self, repo_instance, shallow: bool = True) -> bool:
+        """Atualiza o repositório local com as alterações remotas.
+
+        Por padrão usa o caminho raso: fetch --depth=1 --prune da branch
+        atual seguido de reset --hard na ponta buscada, transferindo só o
+        necessário — o bot precisa da árvore atual, não do histórico
+        completo. O reset só acontece com a árvore limpa e sem commits
+        locais à frente do remoto; havendo trabalho não enviado, a
+        atualização é recusada em vez de descartá-lo. Com shallow=False
+        cai no pull tradicional (merge ou falha explícita). Tudo roda em
+        uma thread: a ida e volta à rede não bloqueia o event loop.
+        """
         try:
-            origin = repo_instance.remotes.origin
-            origin.pull()
+            repo_path = repo_instance.working_tree_dir
+            lock = self._repo_lock(repo_path)
+
+            def _locked_update():
+                with lock:
+                    if not shallow:
+                        repo_instance.remotes.origin.pull()
+                        return
+
+                    # Nunca descarta trabalho: árvore suja aborta antes
+                    # de qualquer contato com a rede
+                    if self._git(repo_path, "status", "--porcelain").stdout.strip():
+                        raise RuntimeError(
+                            "árvore de trabalho com alterações não commitadas"
+                        )
+
+                    # Commits locais à frente do remoto também abortam.
+                    # A checagem usa a ref remota já conhecida, antes do
+                    # fetch: depois de um fetch raso o corte de histórico
+                    # desconecta FETCH_HEAD..HEAD e a contagem mentiria
+                    branch = self._git(
+                        repo_path, "rev-parse", "--abbrev-ref", "HEAD"
+                    ).stdout.strip()
+                    ahead = self._git(
+                        repo_path, "rev-list", "--count", f"origin/{branch}..HEAD"
+                    ).stdout.strip()
+                    if ahead != "0":
+                        raise RuntimeError(
+                            f"{ahead} commit(s) locais ainda não enviados"
+                        )
+
+                    # Busca apenas a branch atual: FETCH_HEAD fica
+                    # inequívoco e o tráfego se limita a uma ponta
+                    self._git(
+                        repo_path, "fetch", "--depth=1", "--prune", "origin", branch
+                    )
+                    self._git(repo_path, "reset", "--hard", "FETCH_HEAD")
+
+            await asyncio.to_thread(_locked_update)
+            self._invalidate_tree_cache(repo_path)
             return True
         except Exception as e:
-            logger.error(f"Erro ao atualizar repositório: {str(e)}")
+            logger.error("Erro ao atualizar repositório: %s", e)
             return False
 
     def run_github_action(self, workflow_name: str, repo_url: str) -> bool:
         """Executa uma GitHub Action específica."""
-        import requests
-
-        headers = {
-            "Authorization": f"token {self.github_token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
-        # Extrai o proprietário e o nome do repositório da URL
-        repo_parts = repo_url.split("/")
-        owner = repo_parts[-2]
-        repo_name = repo_parts[-1].replace(".git", "")
-
-        url = f"https://api.github.com/repos/{owner}/{repo_name}/actions/workflows/{workflow_name}/dispatches"
+        # URL de dispatch cacheada por (repo, workflow): depois do primeiro
+        # disparo o custo por chamada vira um lookup de dicionário + o POST
+        cache_key = (repo_url, workflow_name)
+        url = self._dispatch_url_cache.get(cache_key)
+
+        if url is None:
+            # Extrai o proprietário e o nome do repositório da URL
+            repo_parts = repo_url.split("/")
+            owner = quote(repo_parts[-2], safe="")
+            repo_name = quote(repo_parts[-1].replace(".git", ""), safe="")
+
+            # Dispara pelo id numérico quando a resolução (cacheada por
+            # ETag) está disponível; senão cai para o nome do arquivo
+            workflow_ref = self._resolve_workflow_id(
+                owner, repo_name, quote(workflow_name, safe=""), self._github_headers
+            ) or quote(workflow_name, safe="")
+
+            url = f"https://api.github.com/repos/{owner}/{repo_name}/actions/workflows/{workflow_ref}/dispatches"
+            self._dispatch_url_cache[cache_key] = url
 
         payload = {"ref": "main"}  # Ou a branch que você está usando
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = _GITHUB_SESSION.post(
+                url, headers=self._github_headers, json=payload, timeout=10
+            )
             if response.status_code == 204:
                 return True
             else:
-                logger.error(f"Erro ao executar GitHub Action: {response.text}")
+                logger.error("Erro ao executar GitHub Action: %s", response.text)
                 return False
         except Exception as e:
-            logger.error(f"Erro ao executar GitHub Action: {str(e)}")
+            logger.error("Erro ao executar GitHub Action: %s", e)
             return False
 
     def list_repos(self) -> List[str]:
         """Lista todos os repositórios disponíveis."""
         try:
-            # Lista todos os diretórios no caminho base que são repositórios Git
-            repos = [
-                d
-                for d in os.listdir(self.base_path)
-                if os.path.isdir(os.path.join(self.base_path, d))
-                and os.path.isdir(os.path.join(self.base_path, d, ".git"))
-            ]
-            return repos
+            # A varredura é cacheada e revalidada pelo mtime do diretório base
+            base_stat = os.stat(self.base_path)
+            return list(_scan_repos(self.base_path, base_stat.st_mtime_ns))
         except Exception as e:
-            logger.error(f"Erro ao listar repositórios: {str(e)}")
+            logger.error("Erro ao listar repositórios: %s", e)
             return []
 
     def select_repository(self, chat_id: str, repo_name: str) -> Dict[str, str]:
@@ -106,34 +474,33 @@ class SystemRepository:
             # Constrói o caminho do repositório
             repo_path = os.path.join(self.base_path, repo_name)
 
-            if not os.path.isdir(repo_path):
-                return {
-                    "status": "error",
-                    "message": f"Repositório '{repo_name}' não encontrado.",
-                }
-
-            if not os.path.isdir(os.path.join(repo_path, ".git")):
+            # Caminho feliz com um único stat; a distinção entre "não
+            # existe" e "não é Git" só é paga quando a seleção falha
+            if not _is_git_repo(repo_path):
+                if not os.path.isdir(repo_path):
+                    return {
+                        "status": "error",
+                        "message": f"Repositório '{repo_name}' não encontrado.",
+                    }
                 return {
                     "status": "error",
                     "message": f"O diretório '{repo_name}' não é um repositório Git válido.",
                 }
 
             # Configura o repositório atual para o usuário
-            self.user_current_repos[chat_id] = {
-                "repo_name": repo_name,
-                "repo_path": repo_path,
-                "current_dir": "",  # Caminho relativo dentro do repo, inicialmente vazio (raiz)
-            }
+            self.user_current_repos[chat_id] = UserSession(
+                repo_name=repo_name, repo_path=repo_path
+            )
 
             logger.info(
-                f"Repositório '{repo_name}' selecionado para o usuário {chat_id}"
+                "Repositório '%s' selecionado para o usuário %s", repo_name, chat_id
             )
             return {
                 "status": "success",
                 "message": f"Repositório '{repo_name}' selecionado com sucesso!",
             }
         except Exception as e:
-            logger.error(f"Erro ao selecionar repositório: {str(e)}")
+            logger.error("Erro ao selecionar repositório: %s", e)
             return {
                 "status": "error",
                 "message": f"Erro ao selecionar repositório: {str(e)}",
@@ -142,13 +509,13 @@ class SystemRepository:
     def list_files(self, chat_id: str, path: str = "") -> Dict[str, Any]:
         """Lista arquivos e pastas do diretório especificado."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
-
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
-            current_rel_dir = user_info.get("current_dir", "")
+            repo_path = user_info.repo_path
+            current_rel_dir = user_info.current_dir
 
             # Constrói o caminho completo
             target_rel_path = (
@@ -156,80 +523,108 @@ class SystemRepository:
                 if path
                 else current_rel_dir
             )
-            target_abs_path = os.path.join(repo_path, target_rel_path)
-
-            # Verifica se o caminho existe e é um diretório
-            if not os.path.isdir(target_abs_path):
+            target_abs_path = _safe_resolve(repo_path, target_rel_path)
+
+            # Verifica se o caminho existe e é um diretório (um único stat)
+            try:
+                target_stat = os.stat(target_abs_path)
+            except FileNotFoundError:
+                target_stat = None
+            if target_stat is None or not stat.S_ISDIR(target_stat.st_mode):
                 return {
                     "status": "error",
                     "message": f"Caminho não encontrado ou não é um diretório: {target_rel_path}",
                 }
 
-            # Lista o conteúdo do diretório
-            items = os.listdir(target_abs_path)
-
-            # Separa diretórios e arquivos
+            # Lista o conteúdo do diretório separando diretórios e arquivos;
+            # scandir reaproveita o tipo vindo da leitura do diretório,
+            # dispensando um stat por entrada
             directories = []
             files = []
-
-            for item in items:
-                item_path = os.path.join(target_abs_path, item)
-                if os.path.isdir(item_path):
-                    if item != ".git":  # Opcional: ocultar diretório .git
-                        directories.append(f"{item}/")
-                else:
-                    files.append(item)
-
-            # Retorna os resultados
+            detailed = []
+
+            with os.scandir(target_abs_path) as entries:
+                for entry in entries:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir and entry.name == ".git":
+                        continue  # Opcional: ocultar diretório .git
+                    if is_dir:
+                        directories.append(f"{entry.name}/")
+                    else:
+                        files.append(entry.name)
+                    # O DirEntry.stat cacheado evita um stat extra por
+                    # entrada; poupa clientes de N chamadas de follow-up
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    detailed.append(
+                        {
+                            "name": entry.name,
+                            "size": entry_stat.st_size,
+                            "mtime": entry_stat.st_mtime_ns,
+                            "is_dir": is_dir,
+                        }
+                    )
+
+            # Retorna os resultados; directories/files seguem como listas
+            # de nomes para os consumidores atuais, e entries agrega os
+            # metadados por entrada
+            detailed.sort(key=operator.itemgetter("name"))
             return {
                 "status": "success",
                 "current_path": target_rel_path or "/",
                 "directories": sorted(directories),
                 "files": sorted(files),
+                "entries": detailed,
             }
         except Exception as e:
-            logger.error(f"Erro ao listar diretório: {str(e)}")
+            logger.error("Erro ao listar diretório: %s", e)
             return {"status": "error", "message": f"Erro ao listar diretório: {str(e)}"}
 
     def change_directory(self, chat_id: str, path: str) -> Dict[str, str]:
         """Navega para o diretório especificado."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
-
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
-            current_rel_dir = user_info.get("current_dir", "")
+            repo_path = user_info.repo_path
+            current_rel_dir = user_info.current_dir
 
             # Caso especial para voltar à raiz
             if path == "/":
-                self.user_current_repos[chat_id]["current_dir"] = ""
+                user_info.current_dir = ""
+                self.user_current_repos[chat_id] = user_info
                 return {"status": "success", "current_path": "/"}
 
             # Caso especial para voltar um nível
             if path == "..":
                 new_rel_dir = os.path.dirname(current_rel_dir)
-                self.user_current_repos[chat_id]["current_dir"] = new_rel_dir
+                user_info.current_dir = new_rel_dir
+                self.user_current_repos[chat_id] = user_info
                 return {"status": "success", "current_path": new_rel_dir or "/"}
 
             # Caso normal
             new_rel_dir = os.path.normpath(os.path.join(current_rel_dir, path))
-            new_abs_dir = os.path.join(repo_path, new_rel_dir)
-
-            # Verifica se o caminho existe e é um diretório
-            if not os.path.isdir(new_abs_dir):
+            new_abs_dir = _safe_resolve(repo_path, new_rel_dir)
+
+            # Verifica se o caminho existe e é um diretório (um único stat)
+            try:
+                dir_stat = os.stat(new_abs_dir)
+            except FileNotFoundError:
+                dir_stat = None
+            if dir_stat is None or not stat.S_ISDIR(dir_stat.st_mode):
                 return {
                     "status": "error",
                     "message": f"Caminho não encontrado ou não é um diretório: {new_rel_dir}",
                 }
 
-            # Atualiza o diretório atual
-            self.user_current_repos[chat_id]["current_dir"] = new_rel_dir
+            # Atualiza o diretório atual (atribuição grava no SQLite)
+            user_info.current_dir = new_rel_dir
+            self.user_current_repos[chat_id] = user_info
 
             return {"status": "success", "current_path": new_rel_dir or "/"}
         except Exception as e:
-            logger.error(f"Erro ao navegar para o diretório: {str(e)}")
+            logger.error("Erro ao navegar para o diretório: %s", e)
             return {
                 "status": "error",
                 "message": f"Erro ao navegar para o diretório: {str(e)}",
@@ -238,14 +633,14 @@ class SystemRepository:
     def get_current_directory(self, chat_id: str) -> Dict[str, str]:
         """Obtém o diretório atual."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
-
-            user_info = self.user_current_repos[chat_id]
-            repo_name = user_info["repo_name"]
-            repo_path = user_info["repo_path"]
-            current_dir = user_info.get("current_dir", "") or "/"
+            repo_name = user_info.repo_name
+            repo_path = user_info.repo_path
+            current_dir = user_info.current_dir or "/"
 
             return {
                 "status": "success",
@@ -254,111 +649,168 @@ class SystemRepository:
                 "current_path": current_dir,
             }
         except Exception as e:
-            logger.error(f"Erro ao obter diretório atual: {str(e)}")
+            logger.error("Erro ao obter diretório atual: %s", e)
             return {
                 "status": "error",
                 "message": f"Erro ao obter diretório atual: {str(e)}",
             }
 
-    def generate_tree(self, path, prefix="", max_depth=2, current_depth=0):
-        """Gera uma representação em árvore de um diretório."""
-        if current_depth > max_depth:
-            return ""
-
-        result = ""
-        items = sorted(os.listdir(path))
-
-        # Filtra itens para excluir o diretório .git
-        items = [item for item in items if item != ".git"]
+    @staticmethod
+    def _tree_entries(path, prefix, depth):
+        """Lista as entradas de um diretório já formatadas para a árvore.
+
+        Filtra o diretório .git; scandir carrega o tipo de cada entrada
+        junto com a leitura do diretório, sem stat adicional.
+        """
+        with os.scandir(path) as it:
+            items = sorted(
+                (entry for entry in it if entry.name != ".git"),
+                key=operator.attrgetter("name"),
+            )
 
+        entries = []
         for i, item in enumerate(items):
             is_last = i == len(items) - 1
-            item_path = os.path.join(path, item)
+            connector = "└── " if is_last else "├── "
+            child_prefix = prefix + ("    " if is_last else "│   ")
+            entries.append(
+                (f"{prefix}{connector}{item.name}\n", item, child_prefix, depth)
+            )
+        return entries
 
-            # Adiciona a linha atual
-            if is_last:
-                result += f"{prefix}└── {item}\n"
-                new_prefix = prefix + "    "
-            else:
-                result += f"{prefix}├── {item}\n"
-                new_prefix = prefix + "│   "
+    def generate_tree(
+        self, path, prefix="", max_depth=2, current_depth=0, max_chars=_TREE_WALK_LIMIT
+    ):
+        """Gera uma representação em árvore de um diretório.
 
-            # Recursão para subdiretórios
-            if os.path.isdir(item_path):
-                result += self.generate_tree(
-                    item_path, new_prefix, max_depth, current_depth + 1
-                )
+        Percorre com uma pilha explícita em vez de recursão e escreve em um
+        StringIO (evita a concatenação O(n²) de strings). A varredura é
+        interrompida ao passar do orçamento de caracteres, então diretórios
+        além do corte nem chegam a ser lidos.
+
+        Returns:
+            Tuple[str, bool]: o texto da árvore e se a varredura foi cortada
+            antes de listar tudo.
+        """
+        buf = io.StringIO()
+
+        stack = self._tree_entries(path, prefix, current_depth)
+        stack.reverse()
 
-        return result
+        while stack:
+            line, item, child_prefix, depth = stack.pop()
+            buf.write(line)
+
+            # Já excedeu o orçamento; não varre mais nada
+            if buf.tell() > max_chars:
+                break
+
+            if item.is_dir(follow_symlinks=False) and depth + 1 <= max_depth:
+                children = self._tree_entries(item.path, child_prefix, depth + 1)
+                stack.extend(reversed(children))
+
+        # Sobrou pilha = a saída parou antes do fim da listagem
+        return buf.getvalue(), bool(stack)
 
     def get_tree(self, chat_id: str, max_depth: int = 2) -> Dict[str, Any]:
         """Obtém a estrutura de diretórios em formato de árvore."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
-
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
-            current_rel_dir = user_info.get("current_dir", "") or "/"
+            repo_path = user_info.repo_path
+            # current_dir vazio = raiz do repositório; "/" aqui faria o
+            # os.path.join descartar repo_path e varrer a raiz do sistema
+            current_rel_dir = user_info.current_dir
             current_abs_dir = os.path.join(repo_path, current_rel_dir)
 
+            # Serve do cache quando o diretório raiz da listagem não mudou
+            # desde a última renderização (usuários repetindo /tree)
+            cache_key = (repo_path, current_rel_dir, max_depth)
+            dir_mtime = os.stat(current_abs_dir).st_mtime_ns
+            cached = self._tree_cache.get(cache_key)
+            if cached is not None and cached[0] == dir_mtime:
+                return {"status": "success", "tree": cached[1]}
+
             # Gera a árvore
             tree_header = (
-                f"📂 {os.path.basename(current_abs_dir) or user_info['repo_name']}\n"
+                f"📂 {os.path.basename(current_abs_dir) or user_info.repo_name}\n"
             )
-            tree_content = self.generate_tree(current_abs_dir, "", max_depth)
+            tree_content, truncated = self.generate_tree(current_abs_dir, "", max_depth)
             tree_output = tree_header + tree_content
 
-            # Verifica se a saída não é muito longa para o Telegram
-            if len(tree_output) > 4000:
-                tree_output = (
-                    tree_output[:3900]
-                    + "\n\n... (saída truncada, use profundidade menor)"
-                )
+            # Sinaliza explicitamente quando a varredura foi cortada; o
+            # envio como mensagem ou anexo fica a cargo do bot
+            if truncated:
+                tree_output += "\n\n... (saída truncada, use profundidade menor)"
+
+            # Eviction FIFO simples para limitar o cache a 128 entradas
+            if len(self._tree_cache) >= 128:
+                self._tree_cache.pop(next(iter(self._tree_cache)))
+            self._tree_cache[cache_key] = (dir_mtime, tree_output)
 
             return {"status": "success", "tree": tree_output}
         except Exception as e:
-            logger.error(f"Erro ao gerar árvore: {str(e)}")
+            logger.error("Erro ao gerar árvore: %s", e)
             return {"status": "error", "message": f"Erro ao gerar árvore: {str(e)}"}
 
     def get_file_content(self, chat_id: str, file_path: str) -> Dict[str, Any]:
         """Obtém o conteúdo de um arquivo."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
-
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
-            current_rel_dir = user_info.get("current_dir", "")
+            repo_path = user_info.repo_path
+            current_rel_dir = user_info.current_dir
 
             # Constrói o caminho do arquivo
             file_rel_path = os.path.normpath(os.path.join(current_rel_dir, file_path))
-            file_abs_path = os.path.join(repo_path, file_rel_path)
-
-            # Verifica se o arquivo existe
-            if not os.path.isfile(file_abs_path):
+            file_abs_path = _safe_resolve(repo_path, file_rel_path)
+
+            # Existência, tipo e tamanho saem de um único stat
+            try:
+                file_stat = os.stat(file_abs_path)
+            except FileNotFoundError:
+                file_stat = None
+            if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
                 return {
                     "status": "error",
                     "message": f"Arquivo não encontrado: {file_rel_path}",
                 }
 
-            # Verifica o tamanho do arquivo
-            file_size = os.path.getsize(file_abs_path)
+            file_size = file_stat.st_size
             if file_size > 1000000:  # 1MB
                 return {
                     "status": "error",
                     "message": f"O arquivo é muito grande ({file_size / 1000000:.2f} MB). Posso mostrar apenas arquivos menores que 1 MB.",
                 }
 
-            # Determina o tipo de arquivo para formatação adequada
-            _, file_ext = os.path.splitext(file_abs_path)
-            file_type = file_ext[1:] if file_ext else ""
-
-            # Lê o conteúdo do arquivo
-            with open(file_abs_path, "r", encoding="utf-8", errors="replace") as file:
-                content = file.read()
+            # Determina o tipo de arquivo para formatação adequada: um
+            # rfind no nome-base no lugar da varredura dupla do splitext;
+            # dotfiles (.env) seguem sem tipo, como antes
+            base_name = os.path.basename(file_abs_path)
+            dot = base_name.rfind(".")
+            file_type = base_name[dot + 1 :].lower() if dot > 0 else ""
+
+            # Lê o conteúdo do arquivo (cache chaveado por mtime/tamanho;
+            # arquivos muito grandes são lidos direto para não inflar o
+            # cache); binários são barrados pela sondagem de bytes NUL
+            try:
+                if file_size <= _FILE_CACHE_MAX_SIZE:
+                    content = _read_file_cached(
+                        file_abs_path, file_stat.st_mtime_ns, file_size
+                    )
+                else:
+                    content = _read_text_file(file_abs_path, file_size)
+            except ValueError:
+                return {
+                    "status": "error",
+                    "message": f"Arquivo binário não suportado: {file_rel_path}",
+                }
 
             return {
                 "status": "success",
@@ -367,120 +819,158 @@ class SystemRepository:
                 "content": content,
             }
         except Exception as e:
-            logger.error(f"Erro ao mostrar arquivo: {str(e)}")
+            logger.error("Erro ao mostrar arquivo: %s", e)
             return {"status": "error", "message": f"Erro ao mostrar arquivo: {str(e)}"}
 
     def get_branches(self, chat_id: str) -> Dict[str, Any]:
         """Obtém as branches do repositório."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
+            repo_path = user_info.repo_path
 
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
+            repo = _get_pygit2_repo(repo_path)
 
-            repo = Repo(repo_path)
-
-            # Lista as branches
-            branches = repo.git.branch("-a").split("\n")
+            # Lista as branches em processo (locais e remotas), marcando a atual
+            current = None if repo.head_is_unborn else repo.head.shorthand
+            branches = [
+                f"* {name}" if name == current else f"  {name}"
+                for name in repo.branches
+            ]
 
             return {"status": "success", "branches": branches}
         except Exception as e:
-            logger.error(f"Erro ao listar branches: {str(e)}")
+            logger.error("Erro ao listar branches: %s", e)
             return {"status": "error", "message": f"Erro ao listar branches: {str(e)}"}
 
     def checkout_branch(self, chat_id: str, branch_name: str) -> Dict[str, str]:
         """Faz checkout para uma branch."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
+            repo_path = user_info.repo_path
 
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
-
-            repo = Repo(repo_path)
+            repo = _get_pygit2_repo(repo_path)
 
-            # Executa o checkout
-            repo.git.checkout(branch_name)
+            # Executa o checkout em processo via libgit2
+            branch = repo.lookup_branch(branch_name)
+            if branch is None:
+                # Como o git checkout: se só existe a branch remota, cria
+                # a local rastreando-a (aceita "feature" e "origin/feature")
+                remote_name = (
+                    branch_name if "/" in branch_name else f"origin/{branch_name}"
+                )
+                local_name = remote_name.split("/", 1)[1]
+                branch = repo.lookup_branch(local_name)
+                if branch is None:
+                    remote_branch = repo.lookup_branch(remote_name, BranchType.REMOTE)
+                    if remote_branch is None:
+                        return {
+                            "status": "error",
+                            "message": f"Branch não encontrada: {branch_name}",
+                        }
+                    branch = repo.branches.local.create(
+                        local_name, repo.get(remote_branch.target)
+                    )
+                    branch.upstream = remote_branch
+            with self._repo_lock(repo_path):
+                repo.checkout(branch)
+            self._invalidate_tree_cache(repo_path)
 
             return {
                 "status": "success",
                 "message": f"Alterado para branch: {branch_name}",
             }
         except Exception as e:
-            logger.error(f"Erro ao fazer checkout: {str(e)}")
+            logger.error("Erro ao fazer checkout: %s", e)
             return {"status": "error", "message": f"Erro ao fazer checkout: {str(e)}"}
 
     def get_status(self, chat_id: str) -> Dict[str, Any]:
         """Verifica o status do repositório."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
+            repo_path = user_info.repo_path
 
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
-
-            repo = Repo(repo_path)
+            repo = _get_pygit2_repo(repo_path)
 
-            # Obtém o status
-            status = repo.git.status()
+            # Obtém o status em processo via libgit2
+            status = _format_status(repo)
 
             return {"status": "success", "data": status}
         except Exception as e:
-            logger.error(f"Erro ao verificar status: {str(e)}")
+            logger.error("Erro ao verificar status: %s", e)
             return {"status": "error", "message": f"Erro ao verificar status: {str(e)}"}
 
     def commit_changes(self, chat_id: str, message: str) -> Dict[str, str]:
         """Realiza commit das alterações."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
+            repo_path = user_info.repo_path
 
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
-
-            repo = Repo(repo_path)
+            repo = _get_pygit2_repo(repo_path)
 
-            # Adiciona todas as alterações
-            repo.git.add("--all")
+            with self._repo_lock(repo_path):
+                # Adiciona todas as alterações ao índice
+                index = repo.index
+                index.add_all()
+                index.write()
 
-            # Realiza o commit
-            repo.git.commit("-m", message)
+                # Realiza o commit em processo via libgit2
+                tree = index.write_tree()
+                parents = [] if repo.head_is_unborn else [repo.head.target]
+                signature = repo.default_signature
+                repo.create_commit("HEAD", signature, signature, message, tree, parents)
+            self._invalidate_tree_cache(repo_path)
 
             return {
                 "status": "success",
                 "message": f"Commit realizado com sucesso: '{message}'",
             }
         except Exception as e:
-            logger.error(f"Erro ao realizar commit: {str(e)}")
+            logger.error("Erro ao realizar commit: %s", e)
             return {"status": "error", "message": f"Erro ao realizar commit: {str(e)}"}
 
     def push_changes(self, chat_id: str) -> Dict[str, str]:
         """Envia as alterações para o GitHub."""
         try:
-            # Verifica se um repositório foi selecionado
-            if chat_id not in self.user_current_repos:
+            # Busca a sessão uma única vez (cada acesso é uma consulta
+            # ao SQLite; get + reuso corta a checagem de pertencimento)
+            user_info = self.user_current_repos.get(chat_id)
+            if user_info is None:
                 return {"status": "error", "message": "Nenhum repositório selecionado."}
+            repo_path = user_info.repo_path
 
-            user_info = self.user_current_repos[chat_id]
-            repo_path = user_info["repo_path"]
+            repo = _get_pygit2_repo(repo_path)
 
-            repo = Repo(repo_path)
-
-            # Envia as alterações para o GitHub
-            origin = repo.remotes.origin
-            origin.push()
+            # Envia as alterações para o GitHub em processo, autenticando
+            # com o token da organização
+            callbacks = pygit2.RemoteCallbacks(
+                credentials=pygit2.UserPass(self.github_token, "x-oauth-basic")
+            )
+            refspec = f"refs/heads/{repo.head.shorthand}"
+            with self._repo_lock(repo_path):
+                repo.remotes["origin"].push([refspec], callbacks=callbacks)
 
             return {
                 "status": "success",
                 "message": "Alterações enviadas com sucesso para o GitHub",
             }
         except Exception as e:
-            logger.error(f"Erro ao enviar alterações: {str(e)}")
+            logger.error("Erro ao enviar alterações: %s", e)
             return {
                 "status": "error",
                 "message": f"Erro ao enviar alterações: {str(e)}",